@@ -0,0 +1,114 @@
+"""Benchmark the commit engines on one repository, without the watcher.
+
+Each round rewrites `batch` files of a repository holding `files` files,
+then times one sync as the manager runs it: stage_paths and
+has_staged_changes ("stage"), then commit. Both engines work on their own
+copy of the same repository. Times are medians over the rounds.
+
+    python benchmarks/bench_engines.py
+    python benchmarks/bench_engines.py --files 300 3000 20000 --batches 1 10 1000 --output engines.json
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import git
+from src.commit_engine import ENGINES
+
+
+def git_cmd(*args, cwd=None):
+    return subprocess.run(["git", *args], cwd=cwd, check=True, capture_output=True, text=True).stdout.strip()
+
+
+def make_repo(root, files):
+    os.makedirs(root)
+    git_cmd("init", "-q", root)
+    git_cmd("config", "user.name", "bench", cwd=root)
+    git_cmd("config", "user.email", "bench@localhost", cwd=root)
+    # No background gc while the seed repository is copied
+    git_cmd("config", "gc.auto", "0", cwd=root)
+    for i in range(files):
+        sub = os.path.join(root, f"d{i // 100}")
+        if i % 100 == 0:
+            os.makedirs(sub)
+        with open(os.path.join(sub, f"f{i}.txt"), "w") as f:
+            f.write(f"{i}\n")
+    git_cmd("add", "-A", cwd=root)
+    git_cmd("commit", "-qm", "init", cwd=root)
+    git_cmd("gc", "-q", cwd=root)
+
+
+def run(engine_name, root, files, batch, rounds):
+    engine = ENGINES[engine_name](git.Repo(root))
+    stage, total = [], []
+    try:
+        for rnd in range(rounds):
+            paths = []
+            for j in range(batch):
+                i = (rnd * batch + j) % files
+                rel = os.path.join(f"d{i // 100}", f"f{i}.txt")
+                with open(os.path.join(root, rel), "w") as f:
+                    f.write(f"{i} round {rnd}\n")
+                paths.append(rel)
+            started = time.perf_counter()
+            engine.stage_paths(paths)
+            staged = engine.has_staged_changes()
+            stage.append(time.perf_counter() - started)
+            if staged:
+                engine.commit(f"round {rnd}")
+            total.append(time.perf_counter() - started)
+    finally:
+        engine.close()
+    return {"stage": _median(stage), "sync": _median(total)}
+
+
+def _median(values):
+    return sorted(values)[len(values) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--files", type=int, nargs="+", default=[300, 3000, 20000])
+    parser.add_argument("--batches", type=int, nargs="+", default=[1, 10, 100, 1000])
+    parser.add_argument("--rounds", type=int, default=9)
+    parser.add_argument("--output", help="write the results as JSON")
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'':14} {'stage':^31} {'stage + commit':^31}")
+    print(f"{'files':>7} {'batch':>6} " + f"{'subprocess':>11} {'inprocess':>10} {'speedup':>8} " * 2)
+    for files in args.files:
+        base = tempfile.mkdtemp(prefix="gitsync-bench-engines-")
+        try:
+            make_repo(os.path.join(base, "seed"), files)
+            for batch in args.batches:
+                if batch > files:
+                    continue
+                row = {"files": files, "batch": batch}
+                for name in ("subprocess", "inprocess"):
+                    root = os.path.join(base, f"{name}-{batch}")
+                    shutil.copytree(os.path.join(base, "seed"), root, symlinks=True)
+                    row[name] = run(name, root, files, batch, args.rounds)
+                results.append(row)
+                line = f"{files:>7} {batch:>6} "
+                for key in ("stage", "sync"):
+                    sub, inp = row["subprocess"][key], row["inprocess"][key]
+                    line += f"{sub:>10.4f}s {inp:>9.4f}s {sub / inp:>7.2f}x "
+                print(line)
+        finally:
+            shutil.rmtree(base, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"python": sys.version.split()[0], "git": git_cmd("--version"), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+"""Benchmark GitSyncManager + FileChangeHandler under synthetic file churn.
+
+Every target syncs (local dominance) to a bare repository created on disk,
+used as `origin`, and the GitHub API calls are stubbed, so no network access
+or token is needed. Each workload runs for a number of rounds; a round
+measures the delay between the end of its writes and the moment every
+target pushed them.
+
+    python benchmarks/bench_sync.py --output results.json
+    python benchmarks/bench_sync.py --baseline results.json --workloads save_storm renames
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from watchdog.observers import Observer
+from src.config import SyncConfig
+from src.git_sync import GitSyncManager
+from src.watch_router import WatchRouter
+from src.watcher import FileChangeHandler
+
+BRANCH = "main"
+
+
+def git(*args, cwd=None):
+    return subprocess.run(["git", *args], cwd=cwd, check=True, capture_output=True, text=True).stdout.strip()
+
+
+class Target:
+    """A bare `origin`, its working clone and the GitSyncManager syncing it"""
+
+    def __init__(self, root, index, options):
+        self.bare = os.path.join(root, f"remote{index}.git")
+        self.local = os.path.join(root, f"local{index}")
+        git("init", "--bare", "-q", "-b", BRANCH, self.bare)
+        git("clone", "-q", self.bare, self.local)
+        git("config", "user.name", "bench", cwd=self.local)
+        git("config", "user.email", "bench@localhost", cwd=self.local)
+        git("symbolic-ref", "HEAD", f"refs/heads/{BRANCH}", cwd=self.local)
+        with open(os.path.join(self.local, "README"), "w") as f:
+            f.write("benchmark\n")
+        git("add", ".", cwd=self.local)
+        git("commit", "-qm", "init", cwd=self.local)
+        git("push", "-q", "origin", BRANCH, cwd=self.local)
+        config = SyncConfig(
+            github_token="bench", github_repo=f"bench/repo{index}", local_path=self.local,
+            watch_paths=[self.local], local_dominance=True, target_branch=BRANCH, **options,
+        )
+        self.manager = GitSyncManager(config)
+
+    def git_processes(self):
+        return sum(h.count for h in self.manager.metrics.git_commands.values())
+
+    def is_synced(self, since):
+        manager = self.manager
+        stats = manager.stats()
+        if manager.metrics.last_success is None or manager.metrics.last_success < since:
+            return False
+        if stats["queue_depth"] or stats["pending_paths"] or stats.get("commits_ahead"):
+            return False
+        # Plain git calls, not counted in the manager's git process metrics
+        if git("status", "--porcelain", cwd=self.local):
+            return False
+        return git("rev-parse", "HEAD", cwd=self.local) == git("rev-parse", BRANCH, cwd=self.bare)
+
+
+# --- Workloads: fn(targets, round_index, scale) writes files and returns ---
+
+def save_storm(targets, rnd, scale):
+    """An editor saving the same file over and over"""
+    path = os.path.join(targets[0].local, "storm.txt")
+    for i in range(200 * scale):
+        with open(path, "w") as f:
+            f.write(f"round {rnd} save {i}\n")
+
+
+def bulk_create(targets, rnd, scale):
+    """An unzip or a build output landing at once"""
+    base = os.path.join(targets[0].local, f"bulk{rnd}")
+    os.makedirs(base)
+    for i in range(10000 * scale):
+        sub = os.path.join(base, f"d{i // 500}")
+        if i % 500 == 0:
+            os.makedirs(sub)
+        with open(os.path.join(sub, f"f{i}.txt"), "w") as f:
+            f.write(f"{i}\n")
+
+
+def renames(targets, rnd, scale):
+    """Renaming every file of a directory"""
+    base = os.path.join(targets[0].local, "renames")
+    if rnd == 0:
+        os.makedirs(base, exist_ok=True)
+        for i in range(500 * scale):
+            with open(os.path.join(base, f"r0_{i}.txt"), "w") as f:
+                f.write(f"{i}\n")
+        return
+    for i in range(500 * scale):
+        os.rename(os.path.join(base, f"r{rnd - 1}_{i}.txt"), os.path.join(base, f"r{rnd}_{i}.txt"))
+
+
+def deep_tree(targets, rnd, scale):
+    """Files at every level of a deep directory tree"""
+    path = os.path.join(targets[0].local, f"deep{rnd}")
+    for level in range(40 * scale):
+        path = os.path.join(path, f"l{level}")
+        os.makedirs(path)
+        with open(os.path.join(path, "f.txt"), "w") as f:
+            f.write(f"{level}\n")
+
+
+def many_targets(targets, rnd, scale):
+    """One small change in each of many targets"""
+    for target in targets:
+        with open(os.path.join(target.local, "change.txt"), "w") as f:
+            f.write(f"round {rnd}\n")
+
+
+WORKLOADS = {
+    # name -> (function, number of targets)
+    "save_storm": (save_storm, 1),
+    "bulk_create": (bulk_create, 1),
+    "renames": (renames, 1),
+    "deep_tree": (deep_tree, 1),
+    "many_targets": (many_targets, 20),
+}
+
+
+def _rusage():
+    if resource is None:
+        return 0.0, 0
+    self_usage = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu = self_usage.ru_utime + self_usage.ru_stime + children.ru_utime + children.ru_stime
+    # ru_maxrss is in KiB on Linux, bytes on macOS
+    rss = self_usage.ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+    return cpu, rss
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    if not values:
+        return None
+    k = (len(values) - 1) * pct / 100
+    lo, hi = int(k), min(int(k) + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def run_workload(name, rounds, scale, options, timeout):
+    fn, n_targets = WORKLOADS[name]
+    root = tempfile.mkdtemp(prefix=f"gitsync-bench-{name}-")
+    observer = Observer()
+    targets = []
+    try:
+        with mock.patch("src.github_client.get_client"):
+            targets = [Target(root, i, options) for i in range(n_targets)]
+        router = WatchRouter(observer)
+        for target in targets:
+            router.add(target.local, FileChangeHandler(target.manager))
+        observer.start()
+
+        latencies = []
+        processes_before = sum(t.git_processes() for t in targets)
+        cpu_before, _ = _rusage()
+        for rnd in range(rounds):
+            fn(targets, rnd, scale)
+            written = time.time()
+            deadline = written + timeout
+            while not all(t.is_synced(written) for t in targets):
+                if time.time() > deadline:
+                    raise TimeoutError(f"{name}: round {rnd} not synced after {timeout}s")
+                time.sleep(0.05)
+            latencies.append(time.time() - written)
+        cpu_after, peak_rss = _rusage()
+        processes = sum(t.git_processes() for t in targets) - processes_before
+    finally:
+        observer.stop()
+        if observer.is_alive():
+            observer.join()
+        for target in targets:
+            target.manager.stop()
+        shutil.rmtree(root, ignore_errors=True)
+
+    return {
+        "targets": n_targets,
+        "rounds": rounds,
+        "latency_p50": _percentile(latencies, 50),
+        "latency_p90": _percentile(latencies, 90),
+        "latency_p99": _percentile(latencies, 99),
+        "latency_max": max(latencies),
+        "git_processes": processes,
+        "git_processes_per_round": processes / rounds,
+        "cpu_seconds": cpu_after - cpu_before,
+        "peak_rss_mb": peak_rss / 2 ** 20,
+    }
+
+
+# Metrics compared against the baseline, lower is better
+COMPARED = ["latency_p50", "latency_p90", "git_processes_per_round", "cpu_seconds"]
+
+
+def compare(results, baseline, threshold):
+    """Print the relative change of each metric, returns the regressions"""
+    regressions = []
+    for name, result in results["workloads"].items():
+        base = baseline.get("workloads", {}).get(name)
+        if not base:
+            continue
+        for key in COMPARED:
+            old, new = base.get(key), result.get(key)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            flag = ""
+            if change > threshold:
+                flag = "  REGRESSION"
+                regressions.append((name, key, old, new))
+            print(f"  {name:14} {key:24} {old:10.3f} -> {new:10.3f} ({change:+.1%}){flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--workloads", nargs="+", choices=sorted(WORKLOADS), default=sorted(WORKLOADS))
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--scale", type=int, default=1, help="multiply the workload sizes")
+    parser.add_argument("--engine", choices=["subprocess", "inprocess"], default="subprocess")
+    parser.add_argument("--timeout", type=float, default=300, help="seconds allowed per round")
+    parser.add_argument("--output", help="write the results as JSON (usable as a later --baseline)")
+    parser.add_argument("--baseline", help="compare against a previous --output file")
+    parser.add_argument("--threshold", type=float, default=0.2, help="relative slowdown reported as regression")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s - %(message)s")
+    options = {"sync_delay": 1, "max_sync_wait": 5, "commit_engine": args.engine}
+    results = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "git": git("--version"),
+        "options": options,
+        "workloads": {},
+    }
+    for name in args.workloads:
+        print(f"Running {name}...", flush=True)
+        result = run_workload(name, args.rounds, args.scale, options, args.timeout)
+        results["workloads"][name] = result
+        print(f"  p50 {result['latency_p50']:.2f}s  p90 {result['latency_p90']:.2f}s  "
+              f"git processes/round {result['git_processes_per_round']:.1f}  "
+              f"cpu {result['cpu_seconds']:.2f}s  peak rss {result['peak_rss_mb']:.0f} MB")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print(f"\nCompared to {args.baseline}:")
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,12 @@
-import yaml
 import time
 import os
 import logging
 import sys
-from watchdog.observers import Observer
-from src.watcher import FileChangeHandler
-from src.git_sync import GitSyncManager
-from src.config import SyncConfig
+import argparse
+import multiprocessing
+
+# Heavy dependencies (watchdog, GitPython, requests, yaml) are imported where
+# they are used, so that --gui and --startup-report do not pay for them.
 
 def setup_logging():
     logging.basicConfig(
@@ -18,35 +18,136 @@ def setup_logging():
         ]
     )
 
-def run_sync(configs):
+def start_metrics(args):
+    """Start the metrics endpoint and/or JSON dump requested on the command line"""
+    if not args.metrics_port and not args.metrics_file:
+        return None, []
+    from src.metrics import MetricsRegistry, MetricsServer, MetricsDumper
+    registry = MetricsRegistry()
+    services = []
+    if args.metrics_port:
+        services.append(MetricsServer(registry, args.metrics_port))
+    if args.metrics_file:
+        services.append(MetricsDumper(registry, args.metrics_file, args.metrics_interval))
+    for service in services:
+        service.start()
+    return registry, services
+
+def run_sync(configs, jobs=None, metrics=None, stop=None, config_path=None):
+    from watchdog.observers import Observer
+    from src.config import SyncConfig
+    from src.hot_reload import ConfigWatcher, TargetSet
+    from src.watch_router import WatchRouter
+
     logger = logging.getLogger(__name__)
     observer = Observer()
-    sync_managers = []
-    for config in configs:
-        sync_manager = GitSyncManager(config)
-        sync_managers.append(sync_manager)
-        event_handler = FileChangeHandler(sync_manager)
-        for path in config.watch_paths:
-            observer.schedule(event_handler, path, recursive=True)
-            logger.info(f"Watching directory: {path} (repo: {config.github_repo})")
+    router = WatchRouter(observer)
+    targets = TargetSet(router, metrics=metrics, jobs=jobs)
+    # Edits of the configuration file are applied target by target
+    config_watcher = None
+    if config_path:
+        config_watcher = ConfigWatcher(config_path, observer, lambda path: SyncConfig.from_yaml(path, validate=False))
+
     observer.start()
-    logger.info("Monitoring started. Press Ctrl+C to stop.")
     try:
+        targets.start(configs)
+        if not targets.running:
+            logger.error("No sync target could be started.")
+            if config_watcher is None:
+                return
+        router.log_report()
+        logger.info(f"Monitoring started ({len(targets.running)}/{len(configs)} targets). Press Ctrl+C to stop.")
+        # `stop` is set by the supervisor in worker processes
         while True:
-            time.sleep(1)
+            if stop is None:
+                time.sleep(1)
+            elif stop.wait(1):
+                break
+            new_configs = config_watcher.poll() if config_watcher else None
+            if new_configs is not None:
+                targets.apply(new_configs)
     except KeyboardInterrupt:
         logger.info("Stopping monitoring...")
     finally:
         observer.stop()
         if observer.is_alive():
             observer.join()
+        router.stop()
+        for sync_manager in targets.managers:
+            sync_manager.stop()
+
+def run_async_sync(configs, jobs=None, metrics=None, stop=None, git_concurrency=None):
+    import asyncio
+    from src.async_sync import DEFAULT_GIT_CONCURRENCY, run_async
+    try:
+        asyncio.run(run_async(configs, jobs=jobs, metrics=metrics, stop=stop,
+                              git_concurrency=git_concurrency or DEFAULT_GIT_CONCURRENCY))
+    except KeyboardInterrupt:
+        pass
+
+def run_supervisor(configs, args, base_dir):
+    from src.supervisor import Supervisor
+    runner = run_async_sync if args.async_mode else run_sync
+    runner_kwargs = {"jobs": args.jobs}
+    if args.async_mode:
+        runner_kwargs["git_concurrency"] = args.git_concurrency
+    supervisor = Supervisor(
+        configs, runner, workers=args.workers, runner_kwargs=runner_kwargs,
+        costs_path=os.path.join(base_dir, 'config', 'shard_costs.json'),
+        metrics_path=args.metrics_file, status_interval=args.metrics_interval,
+    )
+    supervisor.run()
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Synchronize local folders with GitHub repositories.")
+    parser.add_argument("--gui", action="store_true", help="open the configuration GUI")
+    parser.add_argument("--jobs", type=int, default=None,
+                        help="number of targets initialized in parallel at startup (default: 8)")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="serve Prometheus metrics on http://127.0.0.1:PORT/metrics")
+    parser.add_argument("--metrics-file", default=None,
+                        help="periodically dump metrics as JSON to this file")
+    parser.add_argument("--metrics-interval", type=int, default=15,
+                        help="seconds between two JSON metrics dumps (default: 15)")
+    parser.add_argument("--async", dest="async_mode", action="store_true",
+                        help="run every target in one asyncio event loop (for hundreds of targets)")
+    parser.add_argument("--git-concurrency", type=int, default=None,
+                        help="git processes running at once with --async (default: 16)")
+    parser.add_argument("--supervisor", action="store_true",
+                        help="spread the targets over several worker processes")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="worker processes with --supervisor (default: one per core)")
+    parser.add_argument("--startup-report", action="store_true",
+                        help="print an import-time breakdown of the sync path and exit")
+    parser.add_argument("--import-budget", type=int, default=None,
+                        help="import-time budget in ms checked by --startup-report")
+    args = parser.parse_args(argv)
+    if args.supervisor and args.metrics_port is not None:
+        # Each worker would bind the port, the supervisor aggregates into --metrics-file
+        parser.error("--metrics-port can not be used with --supervisor, use --metrics-file")
+    return args
+
+def startup_report(args):
+    from src import startup_report as report
+    modules = report.CLI_MODULES + (report.GUI_MODULES if args.gui else [])
+    budget = args.import_budget or report.DEFAULT_IMPORT_BUDGET_MS
+    return 0 if report.print_report(modules, budget) else 1
 
 def main():
+    if sys.argv[1:2] == ['--fsmonitor-hook']:
+        # Run by git as `<exe> --fsmonitor-hook <version> <token>` (frozen builds)
+        from src.fsmonitor import hook_main
+        sys.exit(hook_main(sys.argv[2:]))
+
+    args = parse_args()
+    if args.startup_report:
+        sys.exit(startup_report(args))
+
     setup_logging()
     logger = logging.getLogger(__name__)
 
     # Mode GUI ou exécutable PyInstaller
-    if "--gui" in sys.argv or getattr(sys, 'frozen', False):
+    if args.gui or getattr(sys, 'frozen', False):
         from src.gui import SyncConfigGUI
         app = SyncConfigGUI()
         app.mainloop()
@@ -63,10 +164,27 @@ def main():
                   "Créez-le via la GUI (python main.py --gui) ou copiez un exemple dans config/sync_config.yml\n")
             return
 
-        configs = SyncConfig.from_yaml(config_path)
-        run_sync(configs)
+        from src.config import SyncConfig
+        # Targets are validated while starting, a failing one does not block the others
+        configs = SyncConfig.from_yaml(config_path, validate=False)
+        if args.supervisor:
+            # Workers report their metrics to the supervisor, which writes --metrics-file
+            run_supervisor(configs, args, base_dir)
+            return
+        registry, services = start_metrics(args)
+        try:
+            if args.async_mode:
+                run_async_sync(configs, jobs=args.jobs, metrics=registry,
+                               git_concurrency=args.git_concurrency)
+            else:
+                run_sync(configs, jobs=args.jobs, metrics=registry, config_path=config_path)
+        finally:
+            for service in services:
+                service.stop()
     except Exception as e:
         logger.error(f"Error: {str(e)}", exc_info=True)
 
 if __name__ == "__main__":
+    # Supervisor workers are spawned processes, also from frozen builds
+    multiprocessing.freeze_support()
     main()
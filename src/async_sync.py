@@ -0,0 +1,463 @@
+"""asyncio runtime running many sync targets in a single event loop.
+
+Targets keep the semantics of GitSyncManager (event batching, local or
+remote dominance, batched pushes with backoff, adaptive remote polling) but
+git runs as asyncio subprocesses, bounded by one semaphore shared by every
+target, and loop timers replace the worker, push and poll threads. The
+watchdog observer thread only records events and wakes the loop.
+"""
+import asyncio
+import logging
+import os
+import random
+import signal
+import subprocess
+import time
+from functools import partial
+from .change_queue import ChangeQueue
+from .commit_engine import STAGE_CHUNK, chunks
+from .digest_cache import DigestCache
+from .git_sync import GitSyncManager, clone_args, fetch_args, sparse_args
+from .ignore import IgnoreMatcher
+from .metrics import TargetMetrics, _command_name
+
+# git processes running at the same time, all targets together
+DEFAULT_GIT_CONCURRENCY = 16
+# Targets initialized at the same time
+DEFAULT_ASYNC_STARTUP = 32
+
+
+class GitError(Exception):
+    def __init__(self, args, status, stderr):
+        super().__init__(f"git {' '.join(args)} exited with {status}: {stderr}")
+        self.status = status
+        self.stderr = stderr
+
+
+class AsyncGit:
+    """Run git commands of one working tree as asyncio subprocesses"""
+
+    def __init__(self, cwd, limit, observer=None):
+        self.cwd = cwd
+        self.limit = limit
+        self.observer = observer
+
+    async def __call__(self, *args, check=True, cwd=None):
+        async with self.limit:
+            start = time.perf_counter()
+            proc = await asyncio.create_subprocess_exec(
+                "git", *args, cwd=cwd or self.cwd, stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            out, err = await proc.communicate()
+        if self.observer is not None:
+            self.observer(_command_name(["git", *args]), time.perf_counter() - start)
+        if check and proc.returncode:
+            raise GitError(args, proc.returncode, err.decode(errors="replace").strip())
+        return out.decode(errors="replace").strip()
+
+    async def succeeds(self, *args):
+        try:
+            await self(*args)
+            return True
+        except GitError:
+            return False
+
+
+class AsyncSyncTarget:
+    """One sync target driven by the event loop.
+
+    Exposes the attributes FileChangeHandler and MetricsRegistry rely on
+    (`ignore`, `digests`, `fsmonitor`, `handle_change`, `config`, `metrics`,
+    `stats`), so both are shared with the threaded runtime.
+    """
+
+    def __init__(self, config, git_limit):
+        self.config = config
+        self.logger = logging.getLogger(__name__)
+        self.loop = asyncio.get_running_loop()
+        self.metrics = TargetMetrics()
+        self.git = AsyncGit(config.local_path, git_limit, self.metrics.observe_git)
+        self.applied_sha = None
+        self.changes = ChangeQueue(config.sync_delay, config.max_sync_wait)
+        self.digests = DigestCache(config.digest_cache_size, config.digest_max_file_size)
+        self.ignore = None
+        self.fsmonitor = None
+        self.last_full_sync = time.time()
+        self._lock = asyncio.Lock()
+        self._timer = None
+        self._flushing = False
+        self._tasks = []
+        self._push_wanted = asyncio.Event()
+        self._oldest_unpushed = None
+
+        # Counters, named like the PushScheduler and RemotePoller ones
+        self.pushes = 0
+        self.push_failures = 0
+        self.commits_ahead = 0
+        self.last_push = None
+        self.poll_interval = config.poll_interval
+        self.polls = 0
+        self.updates = 0
+        self.poll_errors = 0
+
+    # Path helpers shared with the threaded manager
+    _relative_paths = GitSyncManager._relative_paths
+    _commit_message = staticmethod(GitSyncManager._commit_message)
+
+    async def start(self):
+        config = self.config
+        if config.fsmonitor:
+            self.logger.warning(f"fsmonitor is not supported by the async runtime, ignored for {config.local_path}")
+        if config.mirror:
+            self.logger.warning(f"mirror is not supported by the async runtime, ignored for {config.local_path}")
+        if config.maintenance:
+            self.logger.warning(f"maintenance is not supported by the async runtime, ignored for {config.local_path}")
+        if config.journal:
+            self.logger.warning(f"journal is not supported by the async runtime, ignored for {config.local_path}")
+        if config.chunk_max_files or config.chunk_max_bytes:
+            self.logger.warning(f"chunk_max_files/chunk_max_bytes are not supported by the async runtime, ignored for {config.local_path}")
+        if config.commit_engine != "subprocess":
+            self.logger.info(f"The async runtime always stages with git subprocesses ({config.local_path})")
+
+        url = f'https://github.com/{config.github_repo}.git'
+        if not os.path.exists(os.path.join(config.local_path, '.git')):
+            if not os.listdir(config.local_path):
+                self.logger.info("Cloning repository...")
+                await self.git("clone", *clone_args(config), url, os.path.abspath(config.local_path),
+                               cwd=os.path.dirname(os.path.abspath(config.local_path)))
+                if config.sparse_paths:
+                    await self.git("sparse-checkout", *sparse_args(config))
+                    await self.git("checkout", "-q", await self.git("symbolic-ref", "--short", "HEAD"))
+            else:
+                self.logger.info(f"No .git found in '{config.local_path}', initializing new git repository.")
+                await self.git("init", "-q")
+                if not await self.git.succeeds("remote", "add", "origin", url):
+                    self.logger.warning(f"Could not set remote for {config.local_path}")
+                if await self.git("status", "--porcelain"):
+                    await self.git("add", "-A")
+                    await self.git("commit", "-q", "--no-verify", "-m", "Initial commit from existing directory")
+                if not await self.git.succeeds("fetch", *fetch_args(config)):
+                    self.logger.warning(f"Could not fetch remote for {config.local_path}")
+
+        if config.sparse_paths and await self._sparse_paths() != config.sparse_paths:
+            await self.git("sparse-checkout", *sparse_args(config))
+        await self._sync_strategy()
+        if not await self.git.succeeds("checkout", "-q", config.target_branch):
+            self.logger.info(f"Creating branch {config.target_branch}")
+            await self.git("checkout", "-q", "-b", config.target_branch)
+
+        # Walks the working tree for .gitignore files
+        self.ignore = await self.loop.run_in_executor(
+            None, partial(IgnoreMatcher, config.local_path, config.ignore, config.watch_paths, config.sparse_paths))
+        if config.local_dominance:
+            self._tasks.append(self.loop.create_task(self._push_loop()))
+        elif config.poll_interval > 0:
+            self._tasks.append(self.loop.create_task(self._poll_loop()))
+
+    async def _sparse_paths(self):
+        try:
+            return (await self.git("sparse-checkout", "list")).splitlines()
+        except GitError:
+            # Not a sparse checkout yet
+            return []
+
+    async def _sync_strategy(self):
+        """Apply sync strategy based on dominance setting"""
+        branch = self.config.target_branch
+        try:
+            if self.config.local_dominance:
+                self.logger.info("Local dominance: pushing local changes to remote")
+                await self._add_all()
+                if not await self.git.succeeds("diff", "--cached", "--quiet"):
+                    await self.git("commit", "-q", "--no-verify", "-m", "Initial sync: Local changes dominant")
+                    await self.git("push", "--force", "origin", branch)
+            else:
+                self.logger.info("Remote dominance: pulling remote changes to local")
+                await self.git("fetch", *fetch_args(self.config))
+                await self._reset_to_remote()
+                self.applied_sha = await self.git("rev-parse", "HEAD")
+        except Exception as e:
+            self.logger.error(f"Error during sync strategy: {e}")
+
+    def handle_change(self, file_path, kind="modified"):
+        """Record a changed path, called from the observer thread"""
+        self.changes.add(file_path, kind)
+        if self._timer is None:
+            self.loop.call_soon_threadsafe(self._arm)
+
+    def _arm(self):
+        """(Re)schedule the flush timer for the pending batch"""
+        if self._timer is not None or self._flushing:
+            return
+        delay = self.changes.due_in()
+        if delay is not None:
+            self._timer = self.loop.call_later(delay, self._on_timer)
+
+    def _on_timer(self):
+        self._timer = None
+        delay = self.changes.due_in()
+        if delay is None:
+            return
+        if delay > 0:
+            # New events extended the quiet window
+            self._timer = self.loop.call_later(delay, self._on_timer)
+            return
+        self._flushing = True
+        self.loop.create_task(self._flush())
+
+    async def _flush(self):
+        try:
+            async with self._lock:
+                await self._sync(self.changes.drain())
+        finally:
+            self._flushing = False
+            self._arm()
+
+    async def _sync(self, batch):
+        paths = batch.paths
+        try:
+            if self.config.local_dominance:
+                # Local changes take priority
+                if await self._stage(batch):
+                    await self.git("commit", "-q", "--no-verify", "-m", self._commit_message(paths))
+                    if batch.first_event is not None:
+                        self.metrics.event_to_commit.observe(time.monotonic() - batch.first_event)
+                    self._request_push()
+            else:
+                # Remote changes take priority
+                relpaths = None if batch.overflow else self._relative_paths(paths)
+                if not await self._pull_remote():
+                    # Remote did not move, only revert what was edited locally
+                    if relpaths is not None:
+                        await self._restore_paths(relpaths)
+                    else:
+                        await self._reset_to_remote()
+
+            self.metrics.mark_success()
+            self.logger.info(f"Synced {len(paths)} path(s) from {batch.events} event(s) in {self.config.local_path}")
+        except Exception as e:
+            self.logger.error(f"Error syncing changes: {e}")
+
+    async def _stage(self, batch):
+        """Stage the batch, returns True when the index differs from HEAD"""
+        relpaths = self._relative_paths(batch.paths)
+        full = (
+            batch.overflow or relpaths is None or
+            time.time() - self.last_full_sync >= self.config.full_sync_interval
+        )
+        if not full:
+            try:
+                root = self.config.local_path
+                present, missing = [], []
+                for rel in relpaths:
+                    (present if os.path.lexists(os.path.join(root, rel)) else missing).append(rel)
+                for chunk in chunks(present, STAGE_CHUNK):
+                    await self.git("add", "-A", "--", *chunk)
+                for chunk in chunks(missing, STAGE_CHUNK):
+                    await self.git("rm", "-r", "--cached", "--ignore-unmatch", "-q", "--", *chunk)
+            except GitError as e:
+                self.logger.warning(f"Path-scoped staging failed, staging the whole tree: {e}")
+                full = True
+        if full:
+            await self._add_all()
+            self.last_full_sync = time.time()
+        return not await self.git.succeeds("diff", "--cached", "--quiet")
+
+    async def _add_all(self):
+        try:
+            await self.git("add", "-A", ".")
+        except GitError as e:
+            # git staged everything else, it only refuses paths outside the sparse cone
+            if "sparse-checkout" not in e.stderr:
+                raise
+
+    async def _pull_remote(self):
+        """Fetch and reset to the remote branch when its tip changed"""
+        branch = self.config.target_branch
+        out = await self.git("ls-remote", "origin", f"refs/heads/{branch}")
+        tip = out.split()[0] if out else None
+        if tip is not None and tip == self.applied_sha:
+            return False
+        await self.git("fetch", *fetch_args(self.config))
+        await self._reset_to_remote()
+        self.applied_sha = await self.git("rev-parse", "HEAD")
+        self.logger.info(f"Applied remote commit {self.applied_sha[:8]} to {self.config.local_path}")
+        return True
+
+    async def _reset_to_remote(self):
+        await self.git("reset", "-q", "--hard", f"origin/{self.config.target_branch}")
+        await self.git("clean", "-fdq")
+
+    async def _restore_paths(self, relpaths):
+        for chunk in chunks(relpaths, STAGE_CHUNK):
+            tracked = (await self.git("ls-files", "--", *chunk)).splitlines()
+            if tracked:
+                await self.git("checkout", "HEAD", "--", *tracked)
+            await self.git("clean", "-fdq", "--", *chunk)
+
+    def _request_push(self):
+        self.commits_ahead += 1
+        if self._oldest_unpushed is None:
+            self._oldest_unpushed = time.monotonic()
+        self._push_wanted.set()
+
+    async def _push_loop(self, base_backoff=2):
+        """Push batched commits, same policy as PushScheduler"""
+        failures = 0
+        while True:
+            await self._push_wanted.wait()
+            self._push_wanted.clear()
+            if await self._push():
+                failures = 0
+                delay = self.config.push_interval
+            else:
+                failures += 1
+                delay = min(self.config.push_max_backoff, base_backoff * 2 ** (failures - 1))
+                delay = random.uniform(delay / 2, delay)
+                self._push_wanted.set()
+            await asyncio.sleep(delay)
+
+    async def _push(self):
+        try:
+            await self.git("push", "--force", "origin", self.config.target_branch)
+        except GitError as e:
+            self.push_failures += 1
+            self.logger.error(f"Push failed for {self.config.github_repo}: {e}")
+            await self._refresh_ahead()
+            return False
+        self.pushes += 1
+        self.last_push = time.time()
+        if self._oldest_unpushed is not None:
+            self.metrics.commit_to_push.observe(time.monotonic() - self._oldest_unpushed)
+        self.metrics.mark_success()
+        self._oldest_unpushed = None
+        await self._refresh_ahead()
+        return True
+
+    async def _refresh_ahead(self):
+        branch = self.config.target_branch
+        try:
+            try:
+                out = await self.git("rev-list", "--count", f"origin/{branch}..{branch}")
+            except GitError:
+                # Never pushed, no remote-tracking branch yet
+                out = await self.git("rev-list", "--count", branch)
+            self.commits_ahead = int(out)
+        except (GitError, ValueError) as e:
+            self.logger.debug(f"Could not count unpushed commits: {e}")
+
+    async def _poll_loop(self):
+        """Adaptive remote polling, same policy as RemotePoller"""
+        max_interval = max(self.config.max_poll_interval, self.config.poll_interval)
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            self.polls += 1
+            try:
+                async with self._lock:
+                    changed = await self._pull_remote()
+            except Exception as e:
+                self.poll_errors += 1
+                self.logger.warning(f"Remote poll failed for {self.config.github_repo}: {e}")
+                changed = False
+            if changed:
+                self.updates += 1
+                self.poll_interval = self.config.poll_interval
+            else:
+                self.poll_interval = min(self.poll_interval * 2, max_interval)
+
+    async def stop(self):
+        """Cancel the timers, sync what is still pending and push it"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        async with self._lock:
+            if self.changes.due_in() is not None:
+                await self._sync(self.changes.drain())
+        if self.config.local_dominance:
+            await self._refresh_ahead()
+            if self.commits_ahead and not await self._push():
+                self.logger.warning(f"{self.commits_ahead} commit(s) of {self.config.local_path} are not pushed")
+
+    def stats(self):
+        stats = self.changes.stats()
+        stats.update(self.digests.stats())
+        if self.config.local_dominance:
+            stats.update({
+                "pushes": self.pushes,
+                "push_failures": self.push_failures,
+                "commits_ahead": self.commits_ahead,
+                "last_push": self.last_push,
+            })
+        elif self.config.poll_interval > 0:
+            stats.update({
+                "remote_polls": self.polls,
+                "remote_updates": self.updates,
+                "remote_poll_errors": self.poll_errors,
+                "remote_poll_interval": self.poll_interval,
+            })
+        return stats
+
+
+async def run_async(configs, jobs=None, metrics=None, git_concurrency=DEFAULT_GIT_CONCURRENCY, stop=None):
+    """Run every target in the current event loop until interrupted or `stop` is set"""
+    from watchdog.observers import Observer
+    from .polling_observer import polling_for
+    from .watch_router import WatchRouter
+    from .watcher import FileChangeHandler
+
+    logger = logging.getLogger(__name__)
+    loop = asyncio.get_running_loop()
+    git_limit = asyncio.Semaphore(git_concurrency)
+    startup_limit = asyncio.Semaphore(jobs or DEFAULT_ASYNC_STARTUP)
+    observer = Observer()
+    router = WatchRouter(observer)
+    targets = []
+    stopping = asyncio.Event()
+    try:
+        loop.add_signal_handler(signal.SIGTERM, stopping.set)
+    except (NotImplementedError, AttributeError):
+        # Windows, Ctrl+C still cancels asyncio.run
+        pass
+
+    async def start(config):
+        async with startup_limit:
+            try:
+                # Validation calls the GitHub API, kept off the loop
+                await loop.run_in_executor(None, config.validate)
+                target = AsyncSyncTarget(config, git_limit)
+                await target.start()
+            except Exception as e:
+                logger.error(f"Could not start {config.github_repo} ({config.local_path}): {e}")
+                return
+        # Each target is watched as soon as it is ready
+        targets.append(target)
+        if metrics is not None:
+            metrics.add(target)
+        event_handler = FileChangeHandler(target)
+        for path in config.watch_paths:
+            router.add(path, event_handler, polling=polling_for(config, path))
+            logger.info(f"Watching directory: {path} (repo: {config.github_repo})")
+
+    observer.start()
+    try:
+        await asyncio.gather(*(start(config) for config in configs))
+        if not targets:
+            logger.error("No sync target could be started.")
+            return
+        router.log_report()
+        logger.info(f"Monitoring started ({len(targets)}/{len(configs)} targets, async). Press Ctrl+C to stop.")
+        if stop is not None:
+            # Set from another process by the supervisor
+            while not stopping.is_set() and not stop.is_set():
+                await asyncio.sleep(1)
+        else:
+            await stopping.wait()
+    finally:
+        logger.info("Stopping monitoring...")
+        observer.stop()
+        await loop.run_in_executor(None, observer.join)
+        await loop.run_in_executor(None, router.stop)
+        await asyncio.gather(*(target.stop() for target in targets), return_exceptions=True)
@@ -0,0 +1,122 @@
+import threading
+import time
+from dataclasses import dataclass
+
+# Forced sync delay under continuous churn when max_sync_wait is not set
+DEFAULT_MAX_WAIT = 30
+
+
+def max_wait_for(quiet_delay, max_wait):
+    """`max_wait`, or DEFAULT_MAX_WAIT when unset, never below `quiet_delay`"""
+    if max_wait is None:
+        max_wait = DEFAULT_MAX_WAIT
+    return max(max_wait, quiet_delay)
+
+
+@dataclass
+class ChangeBatch:
+    # path -> last event kind seen (created, modified, deleted)
+    changes: dict
+    events: int
+    # Some events were dropped, the exact path set is incomplete
+    overflow: bool = False
+    # time.monotonic() of the first event of the batch
+    first_event: float = None
+    # Sequence range of the batch in the durable journal
+    journal_range: tuple = None
+
+    @property
+    def paths(self):
+        return list(self.changes)
+
+
+class ChangeQueue:
+    """Coalesce file events into trailing-edge sync batches.
+
+    A batch is due once no event arrived for `quiet_delay` seconds, or once
+    `max_wait` seconds passed since the first event of the batch, so that
+    continuous churn still gets flushed. `max_wait` None means
+    max(DEFAULT_MAX_WAIT, quiet_delay). With a `journal`, every event is
+    also appended to it, and each batch carries its journal range.
+    """
+
+    def __init__(self, quiet_delay, max_wait, journal=None):
+        self.quiet_delay = quiet_delay
+        self.max_wait = max_wait_for(quiet_delay, max_wait)
+        self.journal = journal
+        self._lock = threading.Lock()
+        self._paths = {}
+        self._events = 0
+        self._overflow = False
+        self._first_event = None
+        self._last_event = None
+
+        # Counters
+        self.events_received = 0
+        self.events_coalesced = 0
+        self.batches = 0
+        self.last_batch_events = 0
+
+    def add(self, path, kind="modified"):
+        now = time.monotonic()
+        with self._lock:
+            self._paths[path] = kind
+            self._touch(now)
+            if self.journal is not None:
+                self.journal.append(path, kind)
+
+    def mark_overflow(self):
+        """Record an event whose path was dropped under backpressure"""
+        now = time.monotonic()
+        with self._lock:
+            self._overflow = True
+            self._touch(now)
+            if self.journal is not None:
+                self.journal.append(None, "overflow")
+
+    def _touch(self, now):
+        self._events += 1
+        self.events_received += 1
+        if self._first_event is None:
+            self._first_event = now
+        self._last_event = now
+
+    def due_in(self):
+        """Seconds until the pending batch should be flushed, None if empty"""
+        with self._lock:
+            if self._first_event is None:
+                return None
+            deadline = min(self._last_event + self.quiet_delay,
+                           self._first_event + self.max_wait)
+            return max(0.0, deadline - time.monotonic())
+
+    def drain(self):
+        """Take the pending batch as a ChangeBatch"""
+        with self._lock:
+            batch = ChangeBatch(self._paths, self._events, self._overflow, self._first_event,
+                                self.journal.cut() if self.journal is not None else None)
+            events = self._events
+            self._paths = {}
+            self._events = 0
+            self._overflow = False
+            self._first_event = None
+            self._last_event = None
+            if events:
+                self.batches += 1
+                self.events_coalesced += events - 1
+                self.last_batch_events = events
+            return batch
+
+    def __len__(self):
+        with self._lock:
+            return len(self._paths)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "events_received": self.events_received,
+                "events_coalesced": self.events_coalesced,
+                "batches": self.batches,
+                "last_batch_events": self.last_batch_events,
+                "pending_paths": len(self._paths),
+            }
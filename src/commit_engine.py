@@ -0,0 +1,379 @@
+import os
+import stat
+import hashlib
+import logging
+import subprocess
+import tempfile
+import time
+import git
+
+# Maximum number of pathspecs given to a single git command
+STAGE_CHUNK = 500
+
+# Index and tree entry modes
+FILE_MODE = 0o100644
+EXEC_MODE = 0o100755
+LINK_MODE = 0o120000
+TREE_MODE = 0o040000
+EMPTY_TREE = '4b825dc642cb6eb9a060e54bf8d69288fbee4904'
+# A `git status` run by hand or by an editor holds the index lock briefly
+LOCK_RETRIES = 20
+LOCK_RETRY_DELAY = 0.05
+# Run by GitPython's index commit, which the in-process engine then uses
+COMMIT_HOOKS = ('pre-commit', 'commit-msg', 'post-commit')
+
+
+def chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def add_all(repo):
+    """`git add -A .`, tolerating files outside of a sparse checkout"""
+    try:
+        repo.git.add('-A', '.')
+    except git.GitCommandError as e:
+        # git staged everything else, it only refuses paths outside the sparse cone
+        if 'sparse-checkout' not in str(e.stderr):
+            raise
+
+
+class SubprocessEngine:
+    """Stage changes by running git commands"""
+
+    name = "subprocess"
+
+    def __init__(self, repo, ignore=None):
+        self.repo = repo
+        self.root = repo.working_tree_dir
+        self.ignore = ignore
+
+    def split_paths(self, relpaths):
+        """Split relative paths into (still present, vanished)"""
+        present, missing = [], []
+        for rel in relpaths:
+            if os.path.lexists(os.path.join(self.root, rel)):
+                present.append(rel)
+            else:
+                missing.append(rel)
+        return present, missing
+
+    def stage_paths(self, relpaths):
+        present, missing = self.split_paths(relpaths)
+        for chunk in chunks(present, STAGE_CHUNK):
+            self.repo.git.add('-A', '--', *chunk)
+        for chunk in chunks(missing, STAGE_CHUNK):
+            self.repo.git.rm('-r', '--cached', '--ignore-unmatch', '-q', '--', *chunk)
+
+    def stage_all(self):
+        add_all(self.repo)
+
+    def has_staged_changes(self):
+        try:
+            # Compares index and HEAD only, without scanning the working tree
+            self.repo.git.diff('--cached', '--quiet')
+            return False
+        except git.GitCommandError:
+            return True
+
+    def commit(self, message):
+        """Commit the index, returns the commit (None when nothing was committed)"""
+        return self.repo.index.commit(message)
+
+    def close(self):
+        pass
+
+
+class InProcessEngine(SubprocessEngine):
+    """Stage changes with as few git processes as possible.
+
+    Blob ids are computed in Python and compared to HEAD through a
+    long-lived `git cat-file --batch` co-process, so unchanged paths are not
+    staged and the staged check needs no process while the index is known.
+    Changed paths are staged by a single `git update-index --stdin`, and the
+    commit is `git write-tree`, `commit-tree` and `update-ref`. The index is
+    never parsed in Python. What it stages is "known" from the last time
+    this engine wrote or checked it until its file changes on disk, or
+    HEAD moves; one `git diff-index --cached` learns it again. Content filters
+    (.gitattributes, core.autocrlf) would change the blob ids, so
+    `supported` refuses repositories using them.
+    """
+
+    name = "inprocess"
+
+    def __init__(self, repo, ignore=None):
+        super().__init__(repo, ignore)
+        self.filemode = _config_bool(repo, 'core', 'filemode', True)
+        self._batch = None
+        self._trees = {}
+        self._trees_head = None
+        # (HEAD, index stat, {path: (mode, sha) or None}) of the last known index
+        self._known = None
+
+    @classmethod
+    def supported(cls, repo):
+        if os.path.exists(os.path.join(repo.working_tree_dir, '.gitattributes')):
+            return False
+        with repo.config_reader() as reader:
+            autocrlf = reader.get_value('core', 'autocrlf', default=False)
+            object_format = reader.get_value('extensions', 'objectformat', default='sha1')
+        # Blob ids are computed as SHA-1 of the raw content
+        return (str(autocrlf).lower() in ('false', '0', '') and str(object_format).lower() == 'sha1'
+                and _config_bool(repo, 'core', 'symlinks', True))
+
+    def stage_paths(self, relpaths):
+        present, missing = self.split_paths(relpaths)
+        files = []
+        for rel in present:
+            full = os.path.join(self.root, rel)
+            if os.path.isdir(full) and not os.path.islink(full):
+                files.extend(self._walk(full))
+            else:
+                files.append(rel)
+        head = self._head()
+        staged = self._staged(head)
+        if any('\n' in rel for rel in files + missing):
+            # Can not be looked up in HEAD, left to git
+            staged = None
+        update, remove_dirs, changes = [], [], {}
+        for rel in files:
+            path = _posix(rel)
+            entry = self._entry(path, head)
+            if staged is not None and entry == staged.get(path, self._head_entry(head, path)):
+                continue
+            update.append(rel)
+            changes[path] = entry
+        for rel in missing:
+            path = _posix(rel)
+            head_entry = self._head_entry(head, path)
+            if staged is None or (head_entry is not None and head_entry[0] == TREE_MODE) or any(
+                    p.startswith(path + '/') for p in staged):
+                # A directory, every entry under it goes
+                remove_dirs.append(rel)
+            elif staged.get(path, head_entry) is not None:
+                update.append(rel)
+                changes[path] = None
+        if update:
+            # Every path in one process, the index is rewritten once
+            with tempfile.TemporaryFile() as paths:
+                paths.write(b''.join(os.fsencode(rel) + b'\0' for rel in update))
+
+                def update_index():
+                    paths.seek(0)
+                    self.repo.git.update_index('--add', '--remove', '--replace', '-z', '--stdin', istream=paths)
+                _retry_locked(update_index)
+        for chunk in chunks(remove_dirs, STAGE_CHUNK):
+            _retry_locked(lambda: self.repo.git.rm('-r', '--cached', '--ignore-unmatch', '-q', '--', *chunk))
+        if remove_dirs:
+            # Which entries went is not tracked, git diff answers next time
+            self._known = None
+        if staged is None or remove_dirs or not update:
+            return
+        for path, entry in changes.items():
+            if entry == self._head_entry(head, path):
+                staged.pop(path, None)
+            else:
+                staged[path] = entry
+        self._known = (head, self._index_stat(), staged)
+
+    def has_staged_changes(self):
+        head = self._head()
+        staged = self._staged(head)
+        if staged is not None:
+            return bool(staged)
+        before = self._index_stat()
+        # One process learns what is staged, the next checks need none
+        out = self.repo.git.diff_index('--cached', '--raw', '-z', '--no-renames', head or EMPTY_TREE)
+        fields = out.split('\0')
+        staged = {}
+        for info, path in zip(fields[0::2], fields[1::2]):
+            _, new_mode, _, new_sha, status = info.split(' ')
+            if status == 'U':
+                # Unmerged, left to git
+                return True
+            staged[path] = None if status == 'D' else (int(new_mode, 8), new_sha)
+        self._known = (head, before, staged)
+        return bool(staged)
+
+    def commit(self, message):
+        if any(os.access(os.path.join(self.repo.git_dir, 'hooks', hook), os.X_OK) for hook in COMMIT_HOOKS):
+            # Only GitPython's index commit runs them
+            self._known = None
+            return super().commit(message)
+        tree = _retry_locked(self.repo.git.write_tree)
+        head = self._head()
+        if head is not None and tree == self._object_name(f"{head}^{{tree}}"):
+            # Nothing staged after all (a file changed again while being staged)
+            self._known = (head, self._index_stat(), {})
+            return None
+        parents = ['-p', head] if head is not None else []
+        with self.repo.config_reader() as reader:
+            author, committer = git.Actor.author(reader), git.Actor.committer(reader)
+        # The identity GitPython's index commit would use, with its fallback when none is configured
+        env = {
+            'GIT_AUTHOR_NAME': author.name, 'GIT_AUTHOR_EMAIL': author.email,
+            'GIT_COMMITTER_NAME': committer.name, 'GIT_COMMITTER_EMAIL': committer.email,
+        }
+        sha = self.repo.git.commit_tree(tree, *parents, '-m', message, env=env)
+        subject = message.split('\n', 1)[0]
+        reflog = f"commit: {subject}" if head is not None else f"commit (initial): {subject}"
+        # Fails instead of overwriting a HEAD moved meanwhile
+        self.repo.git.update_ref('-m', reflog, 'HEAD', sha, head or '')
+        self._known = (sha, self._index_stat(), {})
+        return self.repo.commit(sha)
+
+    def close(self):
+        if self._batch is not None:
+            self._batch.stdin.close()
+            self._batch.wait()
+            self._batch = None
+
+    def _staged(self, head):
+        """Paths staged in the index and how, None when the index is not known"""
+        if self._known is None:
+            return None
+        known_head, index_stat, staged = self._known
+        if known_head != head or index_stat != self._index_stat():
+            self._known = None
+            return None
+        return dict(staged)
+
+    def _head(self):
+        """Commit id of HEAD, None before the first commit"""
+        # Resolved by the co-process, GitPython re-reads packed-refs every time
+        return self._object_name('HEAD')
+
+    def _index_stat(self):
+        try:
+            st = os.stat(os.path.join(self.repo.git_dir, 'index'))
+        except FileNotFoundError:
+            return None
+        # git replaces the index through a lock file, the inode changes too
+        return st.st_ino, st.st_size, st.st_mtime_ns
+
+    def _entry(self, path, head):
+        """(mode, blob id) the path would be staged as, None when it can not be"""
+        full = os.path.join(self.root, path)
+        try:
+            st = os.lstat(full)
+            if stat.S_ISLNK(st.st_mode):
+                return LINK_MODE, _blob_id([os.fsencode(os.readlink(full))])
+            if not stat.S_ISREG(st.st_mode):
+                return None
+            with open(full, 'rb') as f:
+                blob = _blob_id(iter(lambda: f.read(1024 * 1024), b''), st.st_size)
+        except OSError:
+            return None
+        if self.filemode:
+            return EXEC_MODE if st.st_mode & stat.S_IXUSR else FILE_MODE, blob
+        head_entry = self._head_entry(head, path)
+        # Without core.filemode git keeps the mode it has
+        return head_entry[0] if head_entry and head_entry[0] == EXEC_MODE else FILE_MODE, blob
+
+    def _head_entry(self, head, path):
+        """(mode, id) of `path` in HEAD, None when HEAD does not have it"""
+        if head is None or '\n' in path:
+            return None
+        parent, _, name = path.rpartition('/')
+        return self._tree(head, parent).get(name)
+
+    def _tree(self, head, path):
+        if head != self._trees_head:
+            self._trees, self._trees_head = {}, head
+        tree = self._trees.get(path)
+        if tree is None:
+            tree = self._trees[path] = self._read_tree(head, path)
+        return tree
+
+    def _read_tree(self, head, path):
+        parent, _, name = path.rpartition('/')
+        if path and self._tree(head, parent).get(name, (None,))[0] != TREE_MODE:
+            return {}
+        kind, data = self._cat_file(f"{head}:{path}")
+        if kind != 'tree':
+            return {}
+        entries, pos = {}, 0
+        while pos < len(data):
+            space = data.index(b' ', pos)
+            nul = data.index(b'\0', space)
+            mode = int(data[pos:space], 8)
+            entries[os.fsdecode(data[space + 1:nul])] = (mode, data[nul + 1:nul + 21].hex())
+            pos = nul + 21
+        return entries
+
+    def _object_name(self, rev):
+        return self._cat_file(rev, body=False)[1]
+
+    def _cat_file(self, rev, body=True):
+        """(type, content) of `rev` from the cat-file co-process, (None, None) if missing"""
+        if '\n' in rev:
+            raise ValueError(f"can not look up {rev!r}")
+        if self._batch is None or self._batch.poll() is not None:
+            self._batch = subprocess.Popen(
+                ['git', 'cat-file', '--batch'], cwd=self.root,
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        self._batch.stdin.write(rev.encode() + b'\n')
+        self._batch.stdin.flush()
+        header = self._batch.stdout.readline().split()
+        if len(header) != 3:
+            return None, None
+        name, kind, size = header
+        data = self._batch.stdout.read(int(size) + 1)[:-1]
+        return kind.decode(), (data if body else name.decode())
+
+    def _walk(self, directory):
+        for dirpath, dirnames, filenames in os.walk(directory):
+            dirnames[:] = [d for d in dirnames if d != '.git']
+            if self.ignore is not None:
+                dirnames[:] = [d for d in dirnames if not self.ignore.is_ignored(os.path.join(dirpath, d), True)]
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                if self.ignore is None or not self.ignore.is_ignored(path):
+                    yield os.path.relpath(path, self.root)
+
+
+def _retry_locked(func):
+    """Call `func`, again while another git process holds the index lock"""
+    for attempt in range(LOCK_RETRIES):
+        try:
+            return func()
+        except git.GitCommandError as e:
+            if 'index.lock' not in str(e.stderr) or attempt == LOCK_RETRIES - 1:
+                raise
+            time.sleep(LOCK_RETRY_DELAY)
+
+
+def _posix(rel):
+    return rel.replace(os.sep, '/')
+
+
+def _blob_id(parts, size=None):
+    """git's SHA-1 of a blob given as an iterable of byte strings"""
+    parts = list(parts) if size is None else parts
+    if size is None:
+        size = sum(len(part) for part in parts)
+    digest = hashlib.sha1(b'blob %d\0' % size)
+    for part in parts:
+        digest.update(part)
+    return digest.hexdigest()
+
+
+def _config_bool(repo, section, option, default):
+    with repo.config_reader() as reader:
+        value = reader.get_value(section, option, default=default)
+    return str(value).lower() not in ('false', 'no', 'off', '0')
+
+
+ENGINES = {
+    SubprocessEngine.name: SubprocessEngine,
+    InProcessEngine.name: InProcessEngine,
+}
+
+
+def make_engine(name, repo, ignore=None):
+    engine_cls = ENGINES[name]
+    if engine_cls is InProcessEngine and not InProcessEngine.supported(repo):
+        logging.getLogger(__name__).warning(
+            f"{repo.working_tree_dir} uses content filters, falling back to the subprocess commit engine")
+        engine_cls = SubprocessEngine
+    return engine_cls(repo, ignore)
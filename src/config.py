@@ -1,7 +1,5 @@
-import yaml
 import os
-from dataclasses import dataclass
-from github import Github
+from dataclasses import dataclass, field
 
 @dataclass
 class SyncConfig:
@@ -10,19 +8,44 @@ class SyncConfig:
     local_path: str
     watch_paths: list
     sync_delay: int = 1
+    max_sync_wait: int = None
+    full_sync_interval: int = 3600
+    poll_interval: int = 30
+    max_poll_interval: int = 600
+    push_interval: int = 0
+    push_max_backoff: int = 300
+    chunk_max_files: int = 0
+    chunk_max_bytes: int = 0
+    ignore: list = field(default_factory=list)
+    digest_cache_size: int = 10000
+    digest_max_file_size: int = 1024 * 1024
+    commit_engine: str = "subprocess"
+    fsmonitor: bool = False
+    journal: bool = False
+    journal_group_delay: float = 0.2
+    mirror: bool = False
+    mirror_dirs: dict = field(default_factory=dict)
+    maintenance: bool = False
+    maintenance_idle: int = 300
+    maintenance_interval: int = 86400
+    polling_paths: list = field(default_factory=list)
+    polling_interval: float = 2
+    polling_max_interval: float = 60
+    queue_size: int = 10000
+    queue_policy: str = "drop"
     force_sync: bool = False
     create_new_branch: bool = False
     branch_prefix: str = "sync"
     target_branch: str = "main"
     local_dominance: bool = False
+    clone_depth: int = 0
+    clone_filter: str = ""
+    sparse_paths: list = field(default_factory=list)
 
-    def validate(self):
+    def validate(self, check_github=True):
         # Validate GitHub token and repo
-        gh = Github(self.github_token)
-        try:
-            gh.get_repo(self.github_repo)
-        except Exception as e:
-            raise ValueError(f"Invalid GitHub repository: {e}")
+        if check_github:
+            self.validate_github()
 
         # Validate paths
         if not os.path.exists(self.local_path):
@@ -36,6 +59,102 @@ class SyncConfig:
         if self.sync_delay < 1:
             raise ValueError("sync_delay must be at least 1 second")
 
+        # Unset, it follows sync_delay (see max_wait_for)
+        if self.max_sync_wait is not None and self.max_sync_wait < self.sync_delay:
+            raise ValueError("max_sync_wait must be greater than or equal to sync_delay")
+
+        if self.full_sync_interval < 0:
+            raise ValueError("full_sync_interval must be positive")
+
+        # Validate remote polling (remote dominance only, 0 disables it)
+        if self.poll_interval < 0:
+            raise ValueError("poll_interval must be positive")
+
+        if self.max_poll_interval < self.poll_interval:
+            raise ValueError("max_poll_interval must be greater than or equal to poll_interval")
+
+        # Validate push scheduling (local dominance only)
+        if self.push_interval < 0:
+            raise ValueError("push_interval must be positive")
+
+        if self.push_max_backoff < 1:
+            raise ValueError("push_max_backoff must be at least 1 second")
+
+        if self.chunk_max_files < 0 or self.chunk_max_bytes < 0:
+            raise ValueError("chunk_max_files and chunk_max_bytes must be positive (0 disables chunking)")
+
+        if not isinstance(self.ignore, list):
+            raise ValueError("ignore must be a list of patterns")
+
+        if self.digest_cache_size < 0 or self.digest_max_file_size < 0:
+            raise ValueError("digest_cache_size and digest_max_file_size must be positive")
+
+        if self.commit_engine not in ("subprocess", "inprocess"):
+            raise ValueError("commit_engine must be 'subprocess' or 'inprocess'")
+
+        if not isinstance(self.fsmonitor, bool):
+            raise ValueError("fsmonitor must be a boolean")
+
+        if not isinstance(self.journal, bool):
+            raise ValueError("journal must be a boolean")
+
+        if self.journal_group_delay <= 0:
+            raise ValueError("journal_group_delay must be greater than 0")
+
+        # Validate mirroring of external watch paths
+        if not isinstance(self.mirror, bool):
+            raise ValueError("mirror must be a boolean")
+
+        if self.mirror and not self.local_dominance:
+            raise ValueError("mirror requires local_dominance, the watch paths are the source of truth")
+
+        if not isinstance(self.mirror_dirs, dict):
+            raise ValueError("mirror_dirs must map watch paths to repository subdirectories")
+
+        for subdir in self.mirror_dirs.values():
+            parts = os.path.normpath(str(subdir)).split(os.sep)
+            if os.path.isabs(str(subdir)) or parts[0] in (os.curdir, os.pardir, ".git") or os.pardir in parts:
+                raise ValueError(f"mirror_dirs entry '{subdir}' must be a subdirectory of local_path")
+
+        if self.mirror:
+            # A destination is emptied of what its source lacks, sources can not share one
+            from .mirror import mirror_mappings
+            claimed = {}
+            for source, dest in mirror_mappings(self.local_path, self.watch_paths, self.mirror_dirs):
+                for other, other_source in claimed.items():
+                    if dest == other or dest.startswith(other + os.sep) or other.startswith(dest + os.sep):
+                        raise ValueError(
+                            f"watch paths {other_source} and {source} are mirrored into overlapping "
+                            f"directories, set distinct mirror_dirs entries")
+                claimed[dest] = source
+
+        # Validate idle-time maintenance
+        if not isinstance(self.maintenance, bool):
+            raise ValueError("maintenance must be a boolean")
+
+        if self.maintenance_idle < 1:
+            raise ValueError("maintenance_idle must be at least 1 second")
+
+        if self.maintenance_interval < 0:
+            raise ValueError("maintenance_interval must be >= 0")
+
+        # Validate polled watch paths (network mounts, huge trees)
+        if not isinstance(self.polling_paths, list):
+            raise ValueError("polling_paths must be a list of directories")
+
+        if self.polling_interval <= 0:
+            raise ValueError("polling_interval must be greater than 0")
+
+        if self.polling_max_interval < self.polling_interval:
+            raise ValueError("polling_max_interval must be greater than or equal to polling_interval")
+
+        # Validate worker queue
+        if self.queue_size < 1:
+            raise ValueError("queue_size must be at least 1")
+
+        if self.queue_policy not in ("drop", "block"):
+            raise ValueError("queue_policy must be 'drop' or 'block'")
+
         if not isinstance(self.force_sync, bool):
             raise ValueError("force_sync must be a boolean")
 
@@ -47,18 +166,34 @@ class SyncConfig:
         if not isinstance(self.local_dominance, bool):
             raise ValueError("local_dominance must be a boolean")
 
+        # Validate clone options
+        if not isinstance(self.clone_depth, int) or self.clone_depth < 0:
+            raise ValueError("clone_depth must be a positive integer (0 for the full history)")
+
+        if not isinstance(self.clone_filter, str):
+            raise ValueError("clone_filter must be a string such as 'blob:none'")
+
+        if not isinstance(self.sparse_paths, list):
+            raise ValueError("sparse_paths must be a list of directories or patterns")
+
+    def validate_github(self):
+        # Shared with the sync manager, which then reads the cached metadata
+        from .github_client import GitHubError, get_client
+        try:
+            get_client(self.github_token).get_repo(self.github_repo)
+        except GitHubError as e:
+            raise ValueError(f"Invalid GitHub repository: {e}")
+
     @classmethod
-    def from_yaml(cls, path):
+    def from_yaml(cls, path, validate=True):
+        import yaml
         with open(path, 'r') as f:
             data = yaml.safe_load(f)
-            if "sync_targets" in data:
-                configs = []
-                for target in data["sync_targets"]:
-                    config = cls(**target)
-                    config.validate()
-                    configs.append(config)
-                return configs
-            else:
-                config = cls(**data)
-                config.validate()
-                return [config]
+        targets = data["sync_targets"] if "sync_targets" in data else [data]
+        configs = [cls(**target) for target in targets]
+        if validate and configs:
+            # Validation hits the GitHub API, check the targets concurrently
+            from concurrent.futures import ThreadPoolExecutor
+            with ThreadPoolExecutor(max_workers=min(8, len(configs))) as pool:
+                list(pool.map(cls.validate, configs))
+        return configs
@@ -0,0 +1,104 @@
+import hashlib
+import os
+import stat
+import threading
+from collections import OrderedDict
+
+# Read size used while hashing
+CHUNK_SIZE = 1024 * 1024
+
+
+def file_digest(path, chunk_size=CHUNK_SIZE):
+    """blake2b of a file, streamed through a reusable buffer"""
+    digest = hashlib.blake2b(digest_size=20)
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    with open(path, "rb", buffering=0) as f:
+        while True:
+            n = f.readinto(buffer)
+            if not n:
+                break
+            digest.update(view[:n])
+    return digest.digest()
+
+
+class DigestCache:
+    """Bounded LRU of (size, mtime_ns, mode, digest) per path.
+
+    `changed` tells whether a modification event really changed a file:
+    same stat data means nothing to sync, and a file rewritten with the same
+    content (same size, new mtime) is hashed and compared. Files larger than
+    `max_hash_size` are never hashed, only their stat data is compared.
+    """
+
+    def __init__(self, maxsize=10000, max_hash_size=1024 * 1024):
+        self.maxsize = maxsize
+        self.max_hash_size = max_hash_size
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+        # Counters
+        self.unchanged = 0
+        self.hashed = 0
+
+    def changed(self, path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            self.forget(path)
+            return True
+        if not stat.S_ISREG(st.st_mode):
+            return True
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None:
+                self._entries.move_to_end(path)
+        if entry is not None:
+            size, mtime_ns, mode, digest = entry
+            if size == st.st_size and mode == st.st_mode:
+                if mtime_ns == st.st_mtime_ns:
+                    self.unchanged += 1
+                    return False
+                if digest is not None and size <= self.max_hash_size:
+                    new_digest = self._digest(path)
+                    self._store(path, st, new_digest)
+                    if new_digest == digest:
+                        self.unchanged += 1
+                        return False
+                    return True
+        self._store(path, st, self._digest(path) if st.st_size <= self.max_hash_size else None)
+        return True
+
+    def _digest(self, path):
+        try:
+            digest = file_digest(path)
+        except OSError:
+            return None
+        self.hashed += 1
+        return digest
+
+    def _store(self, path, st, digest):
+        with self._lock:
+            self._entries[path] = (st.st_size, st.st_mtime_ns, st.st_mode, digest)
+            self._entries.move_to_end(path)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def forget(self, path, is_directory=False):
+        with self._lock:
+            self._entries.pop(path, None)
+            if not is_directory:
+                return
+            # A removed or moved directory drops everything below it
+            prefix = path.rstrip(os.sep) + os.sep
+            for key in [k for k in self._entries if k.startswith(prefix)]:
+                del self._entries[key]
+
+    def stats(self):
+        with self._lock:
+            size = len(self._entries)
+        return {
+            "digest_cache_entries": size,
+            "events_unchanged": self.unchanged,
+            "files_hashed": self.hashed,
+        }
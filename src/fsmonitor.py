@@ -0,0 +1,221 @@
+"""git core.fsmonitor (protocol v2) support backed by the watcher events.
+
+The running sync process keeps a journal of the paths reported by watchdog
+and serves it on a localhost socket. git runs the hook (this module, or the
+frozen executable with --fsmonitor-hook) as `hook 2 <token>`. The hook asks
+the journal which paths changed since `token` and prints
+`<new token>\\0<path>\\0<path>\\0...`. Any failure, an unknown token or an
+invalidated journal makes git fall back to scanning the working tree.
+"""
+import collections
+import json
+import logging
+import os
+import secrets
+import socket
+import socketserver
+import sys
+import threading
+
+# Written in the git directory, tells the hook where the journal is served
+INFO_FILE = "gitsync-fsmonitor.json"
+COOKIE_PREFIX = "gitsync-fsmonitor-cookie-"
+
+
+class ChangeJournal:
+    """Bounded journal of changed paths with monotonic tokens.
+
+    Tokens look like `<instance>:<sequence>`. A token from another instance
+    (process restart, invalidation) or older than the retained entries can
+    not be answered precisely, and `changes_since` returns None for it.
+    """
+
+    def __init__(self, maxlen=100000):
+        self._lock = threading.Lock()
+        self._entries = collections.deque(maxlen=maxlen)
+        self._seq = 0
+        self.instance = secrets.token_hex(8)
+
+    @property
+    def token(self):
+        with self._lock:
+            return f"{self.instance}:{self._seq}"
+
+    def record(self, relpath):
+        with self._lock:
+            self._seq += 1
+            self._entries.append((self._seq, relpath))
+
+    def invalidate(self):
+        with self._lock:
+            self.instance = secrets.token_hex(8)
+            self._entries.clear()
+
+    def changes_since(self, token):
+        """(new token, sorted changed paths), paths None when unknown"""
+        with self._lock:
+            current = f"{self.instance}:{self._seq}"
+            instance, _, seq = token.partition(":")
+            if instance != self.instance or not seq.isdigit():
+                return current, None
+            seq = int(seq)
+            oldest = self._entries[0][0] if self._entries else self._seq + 1
+            if seq < oldest - 1 and seq < self._seq:
+                # Entries after `seq` were evicted
+                return current, None
+            paths = set()
+            for entry_seq, path in reversed(self._entries):
+                if entry_seq <= seq:
+                    break
+                paths.add(path)
+            return current, sorted(paths)
+
+
+class FsMonitor:
+    """Journal + localhost server for one repository"""
+
+    def __init__(self, repo, cookie_timeout=1.0):
+        self.repo = repo
+        self.root = os.path.realpath(repo.working_tree_dir)
+        self.git_dir = os.path.realpath(repo.git_dir)
+        self.journal = ChangeJournal()
+        self.cookie_timeout = cookie_timeout
+        self.logger = logging.getLogger(__name__)
+        self._secret = secrets.token_hex(16)
+        self._cookies = {}
+        self._cookie_lock = threading.Lock()
+        self._cookie_seq = 0
+        self._server = None
+
+    def record(self, path, is_directory=False):
+        """Record a watcher event, called from the observer thread"""
+        head, tail = os.path.split(os.path.abspath(path))
+        path = os.path.join(os.path.realpath(head), tail)
+        if path == self.git_dir or path.startswith(self.git_dir + os.sep):
+            if tail.startswith(COOKIE_PREFIX):
+                with self._cookie_lock:
+                    event = self._cookies.get(tail)
+                if event is not None:
+                    event.set()
+            return
+        rel = os.path.relpath(path, self.root)
+        if rel == os.curdir or rel.startswith(os.pardir):
+            return
+        rel = rel.replace(os.sep, "/")
+        self.journal.record(rel + "/" if is_directory else rel)
+
+    def _sync_cookie(self):
+        """Wait until the watcher caught up with every change made so far.
+
+        A cookie file is created in the git directory; once its event comes
+        back through the watcher, every earlier change was recorded too.
+        """
+        with self._cookie_lock:
+            self._cookie_seq += 1
+            name = f"{COOKIE_PREFIX}{os.getpid()}-{self._cookie_seq}"
+            event = self._cookies[name] = threading.Event()
+        path = os.path.join(self.git_dir, name)
+        try:
+            with open(path, "w"):
+                pass
+            return event.wait(self.cookie_timeout)
+        finally:
+            with self._cookie_lock:
+                self._cookies.pop(name, None)
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def query(self, token):
+        """Response bytes for the hook, None to make git rescan everything"""
+        if not self._sync_cookie():
+            return None
+        new_token, paths = self.journal.changes_since(token)
+        if paths is None:
+            # "/" tells git that everything may have changed
+            paths = ["/"]
+        return (new_token + "\0" + "".join(p + "\0" for p in paths)).encode("utf-8", "surrogateescape")
+
+    def start(self, hook_command):
+        monitor = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(handler):
+                line = handler.rfile.readline(4096).decode("utf-8", "replace").strip()
+                secret, _, token = line.partition(" ")
+                if not secrets.compare_digest(secret, monitor._secret):
+                    return
+                response = monitor.query(token)
+                if response is not None:
+                    handler.wfile.write(response)
+
+        self._server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="fsmonitor", daemon=True).start()
+
+        info_path = os.path.join(self.git_dir, INFO_FILE)
+        fd = os.open(info_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            json.dump({"port": self._server.server_address[1], "secret": self._secret}, f)
+
+        with self.repo.config_writer() as writer:
+            writer.set_value("core", "fsmonitor", hook_command)
+            writer.set_value("core", "fsmonitorHookVersion", "2")
+            writer.set_value("core", "untrackedCache", "true")
+        self.logger.info(f"fsmonitor enabled for {self.root}")
+
+    def stop(self):
+        """Invalidate the journal and stop answering, git falls back to full scans"""
+        self.journal.invalidate()
+        try:
+            with self.repo.config_writer() as writer:
+                writer.remove_option("core", "fsmonitor")
+        except Exception as e:
+            self.logger.warning(f"Could not unset core.fsmonitor in {self.root}: {e}")
+        try:
+            os.remove(os.path.join(self.git_dir, INFO_FILE))
+        except OSError:
+            pass
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+def hook_command():
+    """Command line stored in core.fsmonitor"""
+    if getattr(sys, "frozen", False):
+        return f'"{sys.executable}" --fsmonitor-hook'
+    return f'"{sys.executable}" "{os.path.abspath(__file__)}"'
+
+
+def hook_main(argv):
+    """Entry point run by git: `hook <version> <token>`, returns the exit code"""
+    if len(argv) < 2 or argv[0] != "2":
+        return 1
+    git_dir = os.environ.get("GIT_DIR") or os.path.join(os.getcwd(), ".git")
+    try:
+        with open(os.path.join(git_dir, INFO_FILE)) as f:
+            info = json.load(f)
+        with socket.create_connection(("127.0.0.1", info["port"]), timeout=5) as conn:
+            conn.sendall(f"{info['secret']} {argv[1]}\n".encode())
+            chunks = []
+            while True:
+                data = conn.recv(65536)
+                if not data:
+                    break
+                chunks.append(data)
+    except (OSError, ValueError, KeyError):
+        return 1
+    response = b"".join(chunks)
+    if not response:
+        return 1
+    out = sys.stdout.buffer
+    out.write(response)
+    out.flush()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(hook_main(sys.argv[1:]))
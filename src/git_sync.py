@@ -1,10 +1,22 @@
 import os
 import git
-from github import Github
 import time
 import logging
 import datetime
-from dataclasses import dataclass
+import threading
+from dataclasses import dataclass, field
+from .change_queue import ChangeBatch, ChangeQueue, max_wait_for
+from .worker import SyncWorker
+from .remote_poller import RemotePoller
+from .push_scheduler import PushScheduler
+from .ignore import IgnoreMatcher, is_cone, resolve_path
+from .digest_cache import DigestCache
+from .journal import SyncJournal, journal_path
+from .mirror import MIRROR_FILE, Mirror
+from .polling_observer import polling_for
+from .maintenance import MaintenanceScheduler
+from .metrics import InstrumentedGit, TargetMetrics
+from .commit_engine import STAGE_CHUNK, add_all, chunks, make_engine
 
 @dataclass
 class SyncConfig:
@@ -13,17 +25,93 @@ class SyncConfig:
     local_path: str
     watch_paths: list
     sync_delay: int = 5
+    max_sync_wait: int = None
+    full_sync_interval: int = 3600
+    poll_interval: int = 30
+    max_poll_interval: int = 600
+    push_interval: int = 0
+    push_max_backoff: int = 300
+    chunk_max_files: int = 0
+    chunk_max_bytes: int = 0
+    ignore: list = field(default_factory=list)
+    digest_cache_size: int = 10000
+    digest_max_file_size: int = 1024 * 1024
+    commit_engine: str = "subprocess"
+    fsmonitor: bool = False
+    journal: bool = False
+    journal_group_delay: float = 0.2
+    mirror: bool = False
+    mirror_dirs: dict = field(default_factory=dict)
+    maintenance: bool = False
+    maintenance_idle: int = 300
+    maintenance_interval: int = 86400
+    polling_paths: list = field(default_factory=list)
+    polling_interval: float = 2
+    polling_max_interval: float = 60
+    queue_size: int = 10000
+    queue_policy: str = "drop"
     force_sync: bool = False
     create_new_branch: bool = False
     target_branch: str = "main"
     local_dominance: bool = False
+    clone_depth: int = 0
+    clone_filter: str = ""
+    sparse_paths: list = field(default_factory=list)
+
+def clone_args(config):
+    """`git clone` options for the shallow, partial and sparse settings"""
+    args = []
+    if config.clone_depth:
+        args.append(f'--depth={config.clone_depth}')
+    if config.clone_filter:
+        args.append(f'--filter={config.clone_filter}')
+    if config.sparse_paths:
+        # Checked out once the sparse patterns are set
+        args.append('--no-checkout')
+    return args
+
+
+def fetch_args(config):
+    """Fetch the target branch only, keeping shallow clones shallow"""
+    branch = config.target_branch
+    args = ['origin', f'+refs/heads/{branch}:refs/remotes/origin/{branch}']
+    if config.clone_depth:
+        args.insert(0, f'--depth={config.clone_depth}')
+    return args
+
+
+def current_sparse_paths(repo):
+    """Patterns of the repository's sparse checkout, [] when it is not sparse"""
+    try:
+        return repo.git.sparse_checkout('list').splitlines()
+    except git.GitCommandError:
+        # "fatal: this worktree is not sparse"
+        return []
+
+
+def sparse_args(config):
+    """`git sparse-checkout set` arguments of sparse_paths"""
+    mode = '--cone' if is_cone(config.sparse_paths) else '--no-cone'
+    return ['set', mode, *config.sparse_paths]
+
 
 class GitSyncManager:
+    # Options applied to a running manager by `reconfigure`, others need a restart
+    LIVE_OPTIONS = (
+        "watch_paths", "sync_delay", "max_sync_wait", "full_sync_interval", "poll_interval",
+        "max_poll_interval", "push_interval", "push_max_backoff", "chunk_max_files", "chunk_max_bytes", "ignore",
+        "digest_cache_size", "digest_max_file_size", "maintenance_idle", "maintenance_interval",
+    )
+
     def __init__(self, config):
         self.config = config
-        self.github = Github(config.github_token)
-        self.remote_repo = self.github.get_repo(config.github_repo)
+        from .github_client import get_client
+        self.github = get_client(config.github_token)
+        # Fails early when the repository is missing or the token cannot read it
+        self.github.get_repo(config.github_repo)
         self.logger = logging.getLogger(__name__)
+        # Last remote commit applied to the working tree (remote dominance)
+        self.applied_sha = None
 
         git_dir = os.path.join(config.local_path, '.git')
         local_path_empty = (
@@ -38,8 +126,12 @@ class GitSyncManager:
                 self.logger.info("Cloning repository...")
                 self.repo = git.Repo.clone_from(
                     f'https://github.com/{config.github_repo}.git',
-                    config.local_path
+                    config.local_path,
+                    multi_options=clone_args(config)
                 )
+                if config.sparse_paths:
+                    self.repo.git.sparse_checkout(*sparse_args(config))
+                    self.repo.git.checkout(self.repo.active_branch.name)
             else:
                 self.logger.info(f"No .git found in '{config.local_path}', initializing new git repository.")
                 self.repo = git.Repo.init(config.local_path)
@@ -55,12 +147,28 @@ class GitSyncManager:
                     self.repo.index.commit("Initial commit from existing directory")
                 # Try to fetch remote if possible
                 try:
-                    self.repo.git.fetch('--all')
+                    self.repo.git.fetch(*fetch_args(config))
                 except Exception as e:
                     self.logger.warning(f"Could not fetch remote: {e}")
 
-        # Initial sync based on dominance
-        self._sync_strategy()
+        # Time every git subprocess of this target
+        self.metrics = TargetMetrics()
+        self.repo.git = InstrumentedGit(self.repo.working_dir, self.metrics.observe_git)
+        if config.sparse_paths and current_sparse_paths(self.repo) != config.sparse_paths:
+            # Existing repository, or sparse_paths changed
+            self.repo.git.sparse_checkout(*sparse_args(config))
+
+        # A target restarted with its journal only replays what was not synced
+        self.journal = None
+        resume = False
+        if config.journal:
+            self.journal = SyncJournal(journal_path(config.local_path), config.journal_group_delay)
+            resume = self._can_resume()
+        if resume:
+            self.logger.info(f"Resuming {config.local_path} from its journal, skipping the initial sync")
+        else:
+            # Initial sync based on dominance
+            self._sync_strategy()
         
         # Setup branch
         try:
@@ -70,7 +178,50 @@ class GitSyncManager:
             self.repo.git.checkout('-b', config.target_branch)
         
         self.last_sync = time.time()
+        self.last_full_sync = time.time()
         self.sync_delay = config.sync_delay
+        self.changes = ChangeQueue(config.sync_delay, config.max_sync_wait, journal=self.journal)
+        self.ignore = IgnoreMatcher(config.local_path, config.ignore, config.watch_paths, config.sparse_paths)
+        self.mirror = None
+        if config.mirror:
+            # Watch paths outside of the repository are copied into it
+            self.mirror = Mirror(config.local_path, config.watch_paths, config.mirror_dirs, self.ignore)
+            try:
+                self.mirror.claim(os.path.join(git_dir, MIRROR_FILE),
+                                  lambda dest: self.repo.git.ls_files('--', dest).splitlines())
+            except ValueError:
+                if self.journal is not None:
+                    self.journal.close()
+                raise
+        self.digests = DigestCache(config.digest_cache_size, config.digest_max_file_size)
+        self.engine = make_engine(config.commit_engine, self.repo, self.ignore)
+        self.fsmonitor = self._start_fsmonitor() if config.fsmonitor else None
+        self._sync_lock = threading.Lock()
+        self.worker = SyncWorker(self, maxsize=config.queue_size, policy=config.queue_policy)
+        if self.mirror is not None and not resume:
+            # Initial copy, committed by the first batch
+            for path, kind in self.mirror.apply(ChangeBatch({}, 0), full=True).changes.items():
+                self.changes.add(path, kind)
+        if resume:
+            replayed = self.journal.replay(self._requeue)
+            if replayed:
+                self.logger.info(f"Replaying {replayed} unfinished change(s) of {config.local_path}")
+        self.worker.start()
+        self.pusher = None
+        if config.local_dominance:
+            self.pusher = PushScheduler(self, config.push_interval, config.push_max_backoff)
+            self.pusher.start()
+            if resume and self.commits_ahead():
+                # Committed before the restart but not pushed
+                self.pusher.request()
+        self.poller = None
+        if not config.local_dominance and config.poll_interval > 0:
+            self.poller = RemotePoller(self, config.poll_interval, config.max_poll_interval)
+            self.poller.start()
+        self.maintenance = None
+        if config.maintenance:
+            self.maintenance = MaintenanceScheduler(self, config.maintenance_idle, config.maintenance_interval)
+            self.maintenance.start()
 
     def _sync_strategy(self):
         """Apply sync strategy based on dominance setting"""
@@ -78,40 +229,339 @@ class GitSyncManager:
             if self.config.local_dominance:
                 self.logger.info("Local dominance: pushing local changes to remote")
                 # Force local changes to remote
-                self.repo.git.add('.')
+                add_all(self.repo)
                 if self.repo.is_dirty():
                     self.repo.index.commit("Initial sync: Local changes dominant")
                     self.repo.git.push('--force', 'origin', self.config.target_branch)
+                if self.journal is not None:
+                    self.journal.set_state('strategy', self._strategy_key())
             else:
                 self.logger.info("Remote dominance: pulling remote changes to local")
                 # Force remote changes to local
-                self.repo.git.fetch('--all')
+                self.repo.git.fetch(*fetch_args(self.config))
                 self.repo.git.reset('--hard', f'origin/{self.config.target_branch}')
                 self.repo.git.clean('-fd')
+                self.applied_sha = self.repo.head.commit.hexsha
+                if self.journal is not None:
+                    self.journal.set_state('strategy', self._strategy_key())
+                    self.journal.set_state('applied_sha', self.applied_sha)
         except Exception as e:
             self.logger.error(f"Error during sync strategy: {e}")
 
-    def handle_change(self, file_path):
-        if time.time() - self.last_sync < self.sync_delay:
-            return
+    def _strategy_key(self):
+        mode = 'local' if self.config.local_dominance else 'remote'
+        return f"{mode}:{self.config.target_branch}"
 
+    def _can_resume(self):
+        """True when the journal of a previous run matches this target and its HEAD"""
+        if not self.journal.existed or self.journal.get_state('strategy') != self._strategy_key():
+            return False
+        if self.config.local_dominance:
+            return True
+        # Remote dominance: the working tree must still be at the last applied commit
+        applied_sha = self.journal.get_state('applied_sha')
         try:
-            if '.git' in file_path or file_path.endswith('.lock'):
+            head = self.repo.head.commit.hexsha
+        except ValueError:
+            return False
+        if applied_sha != head:
+            return False
+        self.applied_sha = applied_sha
+        return True
+
+    def _requeue(self, path, kind):
+        if path is None:
+            self.changes.mark_overflow()
+        else:
+            self.changes.add(path, kind)
+
+    def handle_change(self, file_path, kind="modified"):
+        """Hand a changed path to the target worker, called from the observer thread"""
+        self.worker.submit(file_path, kind)
+
+    def flush(self, force=False):
+        """Sync the pending batch if its quiet window (or max wait) elapsed"""
+        with self._sync_lock:
+            delay = self.changes.due_in()
+            if delay is None or (delay > 0 and not force):
                 return
+            self._sync(self.changes.drain())
+
+    def stop(self):
+        """Stop the worker and sync whatever is still queued"""
+        if self.maintenance is not None:
+            self.maintenance.stop()
+        if self.poller is not None:
+            self.poller.stop()
+        self.worker.stop()
+        self.flush(force=True)
+        if self.pusher is not None:
+            self.pusher.stop()
+        if self.fsmonitor is not None:
+            self.fsmonitor.stop()
+        self.engine.close()
+        if self.journal is not None:
+            self.journal.close()
+
+    def _start_fsmonitor(self):
+        """Answer git's fsmonitor queries from the watcher events"""
+        from .fsmonitor import FsMonitor, hook_command
+        root = os.path.realpath(self.config.local_path)
+        watched = [os.path.realpath(p) for p in self.config.watch_paths]
+        covering = [p for p in watched if root == p or root.startswith(p.rstrip(os.sep) + os.sep)]
+        if not covering:
+            # Changes outside the watch paths would go unreported
+            self.logger.warning(f"fsmonitor disabled for {root}: the repository is not covered by watch_paths")
+            return None
+        if polling_for(self.config, root) or any(polling_for(self.config, p) for p in covering):
+            # The poller does not list .git, git's cookie files would never be seen
+            self.logger.warning(f"fsmonitor disabled for {root}: the repository is polled (polling_paths)")
+            return None
+        fsmonitor = FsMonitor(self.repo)
+        try:
+            fsmonitor.start(hook_command())
+        except Exception as e:
+            self.logger.warning(f"Could not enable fsmonitor for {root}: {e}")
+            fsmonitor.stop()
+            return None
+        return fsmonitor
+
+    def reconfigure(self, config):
+        """Apply a new config in place, returns False when a restart is needed"""
+        old = self.config
+        for name in config.__dataclass_fields__:
+            if name not in self.LIVE_OPTIONS and getattr(config, name) != getattr(old, name):
+                return False
+        wants_poller = not config.local_dominance and config.poll_interval > 0
+        if wants_poller != (self.poller is not None):
+            # The poller thread would have to be started or stopped
+            return False
+        if self.mirror is not None and config.watch_paths != old.watch_paths:
+            return False
+        self.config = config
+        self.sync_delay = config.sync_delay
+        self.changes.quiet_delay = config.sync_delay
+        self.changes.max_wait = max_wait_for(config.sync_delay, config.max_sync_wait)
+        self.digests.maxsize = config.digest_cache_size
+        self.digests.max_hash_size = config.digest_max_file_size
+        if self.pusher is not None:
+            self.pusher.min_interval = config.push_interval
+            self.pusher.max_backoff = config.push_max_backoff
+        if self.poller is not None:
+            self.poller.min_interval = config.poll_interval
+            self.poller.max_interval = max(config.max_poll_interval, config.poll_interval)
+            self.poller.interval = min(max(self.poller.interval, config.poll_interval), self.poller.max_interval)
+        if self.maintenance is not None:
+            self.maintenance.idle = config.maintenance_idle
+            self.maintenance.interval = config.maintenance_interval
+        if config.ignore != old.ignore or config.watch_paths != old.watch_paths:
+            self.ignore.patterns = list(config.ignore)
+            self.ignore.watch_paths = [os.path.realpath(p) for p in config.watch_paths]
+            self.ignore.rebuild()
+        self.logger.info(f"Reconfigured {config.local_path}")
+        return True
 
+    def stats(self):
+        stats = self.changes.stats()
+        stats.update(self.worker.stats())
+        stats.update(self.digests.stats())
+        if self.pusher is not None:
+            stats.update(self.pusher.stats())
+        if self.poller is not None:
+            stats.update(self.poller.stats())
+        if self.journal is not None:
+            stats.update(self.journal.stats())
+        if self.mirror is not None:
+            stats.update(self.mirror.stats())
+        if self.maintenance is not None:
+            stats.update(self.maintenance.stats())
+        return stats
+
+    def _sync(self, batch):
+        paths = batch.paths
+        error = None
+        try:
             if self.config.local_dominance:
                 # Local changes take priority
-                self.repo.git.add('.')
-                if self.repo.is_dirty():
-                    self.repo.index.commit(f"Auto-sync: Changes in {os.path.basename(file_path)}")
-                    self.repo.git.push('--force', 'origin', self.config.target_branch)
+                if self.mirror is not None:
+                    full = batch.overflow or time.time() - self.last_full_sync >= self.config.full_sync_interval
+                    batch = self.mirror.apply(batch, full=full)
+                    paths = batch.paths
+                if self.config.chunk_max_files or self.config.chunk_max_bytes:
+                    self._commit_chunks(batch)
+                elif self._stage(batch):
+                    self.engine.commit(self._commit_message(paths))
+                    if batch.first_event is not None:
+                        self.metrics.event_to_commit.observe(time.monotonic() - batch.first_event)
+                    # Pushed by the scheduler, together with later commits
+                    self.pusher.request()
             else:
                 # Remote changes take priority
-                self.repo.git.fetch('--all')
-                self.repo.git.reset('--hard', f'origin/{self.config.target_branch}')
-                self.repo.git.clean('-fd')
-                
+                relpaths = None if batch.overflow else self._relative_paths(paths)
+                if not self._pull_remote():
+                    # Remote did not move, only revert what was edited locally
+                    if relpaths is not None:
+                        self._restore_paths(relpaths)
+                    else:
+                        self._reset_to_remote()
+
             self.last_sync = time.time()
-            self.logger.info(f"Synced changes in {file_path}")
+            self.metrics.mark_success()
+            self.logger.info(f"Synced {len(paths)} path(s) from {batch.events} event(s) in {self.config.local_path}")
         except Exception as e:
+            error = str(e)
             self.logger.error(f"Error syncing changes: {e}")
+        if self.journal is not None:
+            # Failed batches stay unfinished and are replayed after a restart
+            self.journal.finish(batch.journal_range, error is None, error)
+
+    def push(self):
+        branch = self.config.target_branch
+        if self.config.chunk_max_files or self.config.chunk_max_bytes:
+            # One push per unpushed commit, so a large backlog goes out in bounded
+            # pieces and a failed push resumes after the last commit that made it
+            try:
+                pending = self.repo.git.rev_list('--reverse', f'origin/{branch}..{branch}').split()
+            except git.GitCommandError:
+                pending = []
+            for sha in pending[:-1]:
+                self.repo.git.push('--force', 'origin', f'{sha}:refs/heads/{branch}')
+        self.repo.git.push('--force', 'origin', branch)
+
+    def commits_ahead(self):
+        """Number of local commits not on the remote-tracking branch"""
+        branch = self.config.target_branch
+        try:
+            return int(self.repo.git.rev_list('--count', f'origin/{branch}..{branch}'))
+        except git.GitCommandError:
+            # Never pushed, no remote-tracking branch yet
+            return int(self.repo.git.rev_list('--count', branch))
+
+    def remote_tip(self):
+        """SHA of the remote target branch, asked to the remote without fetching"""
+        out = self.repo.git.ls_remote('origin', f'refs/heads/{self.config.target_branch}')
+        return out.split()[0] if out else None
+
+    def poll_remote(self):
+        """Apply remote changes if the branch moved, returns True when it did"""
+        with self._sync_lock:
+            return self._pull_remote()
+
+    def _pull_remote(self):
+        """Fetch and reset to the remote branch when its tip changed"""
+        tip = self.remote_tip()
+        if tip is not None and tip == self.applied_sha:
+            return False
+        self.repo.git.fetch(*fetch_args(self.config))
+        self._reset_to_remote()
+        self.applied_sha = self.repo.head.commit.hexsha
+        if self.journal is not None:
+            self.journal.set_state('applied_sha', self.applied_sha)
+        self.logger.info(f"Applied remote commit {self.applied_sha[:8]} to {self.config.local_path}")
+        return True
+
+    def _reset_to_remote(self):
+        self.repo.git.reset('--hard', f'origin/{self.config.target_branch}')
+        self.repo.git.clean('-fd')
+
+    def _restore_paths(self, relpaths):
+        for chunk in chunks(relpaths, STAGE_CHUNK):
+            tracked = self.repo.git.ls_files('--', *chunk).splitlines()
+            if tracked:
+                self.repo.git.checkout('HEAD', '--', *tracked)
+            self.repo.git.clean('-fdq', '--', *chunk)
+
+    def _stage(self, batch):
+        """Stage the batch, returns True when the index differs from HEAD"""
+        relpaths = self._relative_paths(batch.paths)
+        full = (
+            batch.overflow or relpaths is None or
+            time.time() - self.last_full_sync >= self.config.full_sync_interval
+        )
+        if not full:
+            try:
+                self.engine.stage_paths(relpaths)
+            except git.GitCommandError as e:
+                # e.g. a path ignored by git but not by the watcher
+                self.logger.warning(f"Path-scoped staging failed, staging the whole tree: {e}")
+                full = True
+        if full:
+            # Periodic safety reconciliation of the whole working tree
+            self.engine.stage_all()
+            self.last_full_sync = time.time()
+        return self.engine.has_staged_changes()
+
+    def _commit_chunks(self, batch):
+        """Commit the batch as several commits bounded by chunk_max_files/bytes"""
+        relpaths = self._relative_paths(batch.paths)
+        if (batch.overflow or relpaths is None or
+                time.time() - self.last_full_sync >= self.config.full_sync_interval):
+            # Every modified, deleted or untracked path of the working tree
+            out = self.repo.git.ls_files('-z', '--modified', '--deleted', '--others', '--exclude-standard')
+            relpaths = list(dict.fromkeys(p for p in out.split('\0') if p))
+            self.last_full_sync = time.time()
+        plan = self._plan_chunks(relpaths)
+        total = len(plan)
+        for i, chunk in enumerate(plan, 1):
+            last = i == total
+            try:
+                self.engine.stage_paths(chunk)
+            except git.GitCommandError as e:
+                # The remaining paths go into this last commit
+                self.logger.warning(f"Path-scoped staging failed, staging the whole tree: {e}")
+                self.engine.stage_all()
+                chunk = [rel for rest in plan[i - 1:] for rel in rest]
+                total, last = i, True
+            if self.engine.has_staged_changes():
+                message = self._commit_message(chunk)
+                if total > 1:
+                    message += f" (part {i}/{total})"
+                self.engine.commit(message)
+                if batch.first_event is not None:
+                    self.metrics.event_to_commit.observe(time.monotonic() - batch.first_event)
+                self.pusher.request()
+            if last:
+                break
+
+    def _plan_chunks(self, relpaths):
+        """Split paths into chunks of at most chunk_max_files paths / chunk_max_bytes bytes"""
+        max_files = self.config.chunk_max_files or len(relpaths) or 1
+        max_bytes = self.config.chunk_max_bytes
+        plan, chunk, size = [], [], 0
+        for rel in relpaths:
+            try:
+                file_size = os.lstat(os.path.join(self.config.local_path, rel)).st_size
+            except OSError:
+                # Deleted, only the index entry goes away
+                file_size = 0
+            if chunk and (len(chunk) >= max_files or (max_bytes and size + file_size > max_bytes)):
+                plan.append(chunk)
+                chunk, size = [], 0
+            chunk.append(rel)
+            size += file_size
+        if chunk:
+            plan.append(chunk)
+        return plan
+
+    def _relative_paths(self, paths):
+        """Paths relative to the repo root, None if one lies outside of it"""
+        root = os.path.realpath(self.config.local_path)
+        relpaths = []
+        for path in paths:
+            try:
+                rel = os.path.relpath(resolve_path(path), root)
+            except ValueError:
+                # Different drive on Windows
+                return None
+            if rel == os.curdir or rel.startswith(os.pardir):
+                return None
+            relpaths.append(rel)
+        return relpaths
+
+    @staticmethod
+    def _commit_message(paths):
+        if not paths:
+            return "Auto-sync: Changes"
+        if len(paths) == 1:
+            return f"Auto-sync: Changes in {os.path.basename(paths[0])}"
+        return f"Auto-sync: Changes in {len(paths)} files"
@@ -0,0 +1,225 @@
+"""Shared GitHub API clients with a persistent repository metadata cache.
+
+One client per token is kept for the whole process, each with a pooled
+HTTP session, so targets sharing a token share connections and rate limit
+bookkeeping. Repository metadata is cached on disk with its ETag. Within
+`ttl` seconds the cache answers without any request. After that a
+conditional request (If-None-Match) revalidates it, and GitHub does not
+count 304 answers against the rate limit. Once the rate limit is exhausted,
+the cached metadata is served, even when stale, until the limit resets.
+
+The API root defaults to https://api.github.com and can be pointed at a
+local stand-in with `configure(api_url=...)` or GITSYNC_GITHUB_API_URL.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+DEFAULT_API_URL = "https://api.github.com"
+DEFAULT_TTL = 3600
+DEFAULT_POOL_SIZE = 10
+# Requests kept in reserve, the cache is used below this many remaining
+RATE_LIMIT_RESERVE = 10
+REQUEST_TIMEOUT = 15
+
+
+def _default_cache_path():
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "git-auto-sync", "github_api.json")
+
+
+_settings = {
+    "api_url": os.environ.get("GITSYNC_GITHUB_API_URL", DEFAULT_API_URL),
+    "cache_path": os.environ.get("GITSYNC_GITHUB_CACHE", _default_cache_path()),
+    "ttl": DEFAULT_TTL,
+}
+_clients = {}
+_caches = {}
+_lock = threading.Lock()
+
+
+class GitHubError(Exception):
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+class RateLimitError(GitHubError):
+    def __init__(self, reset_at):
+        wait = max(0, int(reset_at - time.time()))
+        super().__init__(f"GitHub API rate limit exhausted, resets in {wait}s", status=403)
+        self.reset_at = reset_at
+
+
+def configure(api_url=None, cache_path=None, ttl=None):
+    """Change the API root, cache file or TTL of the clients created afterwards"""
+    with _lock:
+        if api_url is not None:
+            _settings["api_url"] = api_url.rstrip("/")
+        if cache_path is not None:
+            _settings["cache_path"] = cache_path
+        if ttl is not None:
+            _settings["ttl"] = ttl
+        _clients.clear()
+
+
+def get_client(token):
+    """Process-wide client of `token`"""
+    with _lock:
+        key = (token, _settings["api_url"])
+        client = _clients.get(key)
+        if client is None:
+            path = _settings["cache_path"]
+            cache = _caches.get(path)
+            if cache is None:
+                cache = _caches[path] = MetadataCache(path)
+            client = _clients[key] = GitHubClient(token, _settings["api_url"], cache, _settings["ttl"])
+        return client
+
+
+def _token_id(token):
+    # Cached answers depend on what the token may see, the token is not stored
+    return hashlib.sha256(token.encode()).hexdigest()[:16]
+
+
+class MetadataCache:
+    """JSON file of {key: {"etag", "data", "fetched_at"}}, written atomically"""
+
+    def __init__(self, path):
+        self.path = path
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._entries = self._load()
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"Could not read {self.path}: {e}")
+            return {}
+
+    def get(self, key):
+        with self._lock:
+            return self._entries.get(key)
+
+    def put(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._save()
+
+    def _save(self):
+        if not self.path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._entries, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            self.logger.warning(f"Could not write {self.path}: {e}")
+
+
+class GitHubClient:
+    """GitHub REST client of one token"""
+
+    def __init__(self, token, api_url, cache, ttl=DEFAULT_TTL, pool_size=DEFAULT_POOL_SIZE):
+        import requests
+        from requests.adapters import HTTPAdapter
+        self.api_url = api_url.rstrip("/")
+        self.cache = cache
+        self.ttl = ttl
+        self.logger = logging.getLogger(__name__)
+        self._token_id = _token_id(token)
+        self._lock = threading.Lock()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            "Authorization": f"Bearer {token}",
+            "Accept": "application/vnd.github+json",
+            "User-Agent": "git-auto-sync",
+        })
+        self.rate_remaining = None
+        self.rate_reset = 0.0
+
+        # Counters
+        self.requests = 0
+        self.not_modified = 0
+        self.cache_hits = 0
+
+    def get_repo(self, full_name):
+        """Metadata of `full_name` ("owner/repo") as a dict"""
+        key = f"{self._token_id}:{self.api_url}/repos/{full_name}"
+        entry = self.cache.get(key)
+        now = time.time()
+        if entry is not None and now - entry["fetched_at"] < self.ttl:
+            self.cache_hits += 1
+            return entry["data"]
+        if entry is not None and self._rate_limited(now, RATE_LIMIT_RESERVE):
+            self.cache_hits += 1
+            return entry["data"]
+        if self._rate_limited(now, 0):
+            raise RateLimitError(self.rate_reset)
+
+        headers = {"If-None-Match": entry["etag"]} if entry is not None and entry.get("etag") else {}
+        try:
+            response = self.session.get(f"{self.api_url}/repos/{full_name}", headers=headers, timeout=REQUEST_TIMEOUT)
+        except Exception as e:
+            if entry is not None:
+                # Offline, the last known metadata is still the best answer
+                self.logger.warning(f"GitHub API unreachable, using cached metadata of {full_name}: {e}")
+                return entry["data"]
+            raise GitHubError(f"GitHub API unreachable: {e}")
+        self.requests += 1
+        self._update_rate_limit(response)
+
+        if response.status_code == 304 and entry is not None:
+            self.not_modified += 1
+            entry = dict(entry, fetched_at=now)
+        elif response.status_code == 200:
+            entry = {"etag": response.headers.get("ETag"), "data": response.json(), "fetched_at": now}
+        elif response.status_code in (403, 429) and self._rate_limited(now, 0):
+            if entry is not None:
+                return entry["data"]
+            raise RateLimitError(self.rate_reset)
+        else:
+            try:
+                message = response.json().get("message", response.reason)
+            except ValueError:
+                message = response.reason
+            raise GitHubError(f"{response.status_code} {message}", status=response.status_code)
+        self.cache.put(key, entry)
+        return entry["data"]
+
+    def _update_rate_limit(self, response):
+        remaining = response.headers.get("X-RateLimit-Remaining")
+        reset = response.headers.get("X-RateLimit-Reset")
+        with self._lock:
+            if remaining is not None:
+                self.rate_remaining = int(remaining)
+            if reset is not None:
+                self.rate_reset = float(reset)
+            retry_after = response.headers.get("Retry-After")
+            if response.status_code in (403, 429) and retry_after is not None:
+                self.rate_remaining = 0
+                self.rate_reset = max(self.rate_reset, time.time() + float(retry_after))
+
+    def _rate_limited(self, now, reserve):
+        with self._lock:
+            return self.rate_remaining is not None and self.rate_remaining <= reserve and now < self.rate_reset
+
+    def stats(self):
+        return {
+            "github_requests": self.requests,
+            "github_not_modified": self.not_modified,
+            "github_cache_hits": self.cache_hits,
+            "github_rate_remaining": self.rate_remaining,
+        }
@@ -2,9 +2,18 @@ import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 import yaml
 import os
+import logging
+import threading
+from collections import deque
 
 CONFIG_PATH = "config/sync_config.yml"
 
+# Console : lignes conservées, lignes en attente, rythme de rafraîchissement
+CONSOLE_MAX_LINES = 5000
+CONSOLE_MAX_PENDING = 10000
+CONSOLE_BATCH = 500
+CONSOLE_DRAIN_MS = 100
+
 LANGS = {
     "fr": {
         "add_repo": "Ajouter un dépôt",
@@ -70,6 +79,8 @@ class SyncTargetFrame(ttk.LabelFrame):
         self.texts = LANGS[self.lang]
         super().__init__(master, text=f"{self.texts['sync_target']} {idx+1}", **kwargs)
         self.entries = {}
+        # Options sans champ dans le formulaire, conservées telles quelles
+        self.extra = {}
         self.remove_callback = remove_callback
         self._fields = [
             ("github_token", "github_token"),
@@ -123,7 +134,7 @@ class SyncTargetFrame(ttk.LabelFrame):
             self.remove_callback(self)
 
     def get_data(self):
-        data = {}
+        data = dict(self.extra)
         errors = []
         for key, entry in self.entries.items():
             val = entry.get().strip()
@@ -149,14 +160,14 @@ class SyncTargetFrame(ttk.LabelFrame):
             elif key in ("force_sync", "create_new_branch", "local_dominance"):
                 data[key] = val.lower() == "true"
             else:
-                if key not in data:
-                    data[key] = val
+                data[key] = val
         if errors:
             raise ValueError("; ".join(errors))
         return data
 
     def set_data(self, data):
         # Remplit les champs à partir d'un dict
+        self.extra = {k: v for k, v in data.items() if k not in self.entries}
         for key, entry in self.entries.items():
             val = data.get(key, "")
             if isinstance(val, list):
@@ -175,6 +186,21 @@ class SyncTargetFrame(ttk.LabelFrame):
         self._browse_btn.config(text=self.texts["browse"])
         self._remove_btn.config(text=self.texts["remove"])
 
+class ConsoleLogHandler(logging.Handler):
+    """Send log records (GitSyncManager, watcher...) to the GUI console"""
+
+    def __init__(self, gui, level=logging.INFO):
+        super().__init__(level)
+        self.gui = gui
+        self.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s", "%H:%M:%S"))
+
+    def emit(self, record):
+        try:
+            self.gui.append_console(self.format(record))
+        except Exception:
+            self.handleError(record)
+
+
 class SyncConfigGUI(tk.Tk):
     def __init__(self):
         super().__init__()
@@ -243,6 +269,16 @@ class SyncConfigGUI(tk.Tk):
         self.console_text = tk.Text(self.console_frame, height=12, state="disabled", bg="#222", fg="#0f0")
         self.console_text.pack(fill="both", expand=True)
 
+        # Tout thread peut écrire dans la console : les lignes attendent dans un tampon borné
+        # et le thread Tk les insère par lots, toutes les CONSOLE_DRAIN_MS ms
+        self._console_pending = deque(maxlen=CONSOLE_MAX_PENDING)
+        self._console_dropped = 0
+        self._ui_calls = deque()
+        self._main_thread = threading.current_thread()
+        self.log_handler = ConsoleLogHandler(self)
+        logging.getLogger("src").addHandler(self.log_handler)
+        self.after(CONSOLE_DRAIN_MS, self._drain_console)
+
         self.add_target()  # Add first target by default
 
     def add_target(self):
@@ -318,26 +354,58 @@ class SyncConfigGUI(tk.Tk):
             self.show_error(f"Erreur lors du chargement : {e}")
 
     def close_gui(self):
+        logging.getLogger("src").removeHandler(self.log_handler)
         self.destroy()
         # La console Python reste ouverte pour les logs
 
-    # Optionnel : méthode pour afficher un message dans la zone console
+    # Appelable depuis n'importe quel thread : la ligne est affichée par _drain_console
     def append_console(self, text):
-        self.console_text.config(state="normal")
-        self.console_text.insert(tk.END, text + "\n")
-        self.console_text.see(tk.END)
-        self.console_text.config(state="disabled")
+        if len(self._console_pending) == CONSOLE_MAX_PENDING:
+            # La ligne la plus ancienne sort du tampon borné
+            self._console_dropped += 1
+        self._console_pending.append(text)
+
+    def _drain_console(self):
+        """Exécuté par le thread Tk : appels UI en attente, puis un lot de lignes de la console"""
+        while self._ui_calls:
+            func, args = self._ui_calls.popleft()
+            try:
+                func(*args)
+            except Exception as e:
+                logging.getLogger(__name__).error(f"UI call failed: {e}")
+        lines = []
+        if self._console_dropped:
+            lines.append(f"... {self._console_dropped} ligne(s) non affichée(s)")
+            self._console_dropped = 0
+        while self._console_pending and len(lines) < CONSOLE_BATCH:
+            lines.append(self._console_pending.popleft())
+        if lines:
+            # Ne défile que si la vue était déjà en bas, pour ne pas gêner la lecture
+            at_bottom = self.console_text.yview()[1] >= 1.0
+            self.console_text.config(state="normal")
+            self.console_text.insert(tk.END, "\n".join(lines) + "\n")
+            # Ne garde que les CONSOLE_MAX_LINES dernières lignes
+            excess = int(self.console_text.index("end-1c").split(".")[0]) - 1 - CONSOLE_MAX_LINES
+            if excess > 0:
+                self.console_text.delete("1.0", f"{excess + 1}.0")
+            if at_bottom:
+                self.console_text.see(tk.END)
+            self.console_text.config(state="disabled")
+        # Plus tôt tant qu'il reste des lignes en attente
+        self.after(1 if self._console_pending else CONSOLE_DRAIN_MS, self._drain_console)
 
     def show_error(self, msg):
         self.append_console(msg)
-        messagebox.showerror(self.texts["error"], msg)
+        if threading.current_thread() is self._main_thread:
+            messagebox.showerror(self.texts["error"], msg)
+        else:
+            # Tk n'est pas thread-safe : la boîte de dialogue est ouverte par le thread Tk
+            self._ui_calls.append((messagebox.showerror, (self.texts["error"], msg)))
 
     def run_sync_from_gui(self):
         from src.config import SyncConfig
-        from src.git_sync import GitSyncManager
-        from src.watcher import FileChangeHandler
-        import logging
-        import threading
+        from src.hot_reload import ConfigWatcher, TargetSet
+        from src.watch_router import WatchRouter
         from watchdog.observers import Observer
         import time
 
@@ -364,9 +432,8 @@ class SyncConfigGUI(tk.Tk):
         errors = []
         for idx, target in enumerate(sync_targets):
             try:
-                config = SyncConfig(**target)
-                config.validate()
-                configs.append(config)
+                # La validation (API GitHub) se fait en parallèle au démarrage
+                configs.append(SyncConfig(**target))
             except Exception as e:
                 msg = f"{self.texts['error_config']} (#{idx+1}): {e}"
                 self.show_error(msg)
@@ -376,29 +443,33 @@ class SyncConfigGUI(tk.Tk):
             return
 
         def sync_thread():
-            logger = logging.getLogger(__name__)
             observer = Observer()
-            sync_managers = []
+            router = WatchRouter(observer)
+
+            def ready(config, sync_manager):
+                # Les lignes "Watching directory" arrivent déjà par ConsoleLogHandler
+                self.append_console(f"✅ {config.local_path} prêt pour la synchronisation.")
+
+            def failed(config, e):
+                self.show_error(f"❌ {config.local_path} : {e}")
+
+            targets = TargetSet(router, on_ready=ready, on_error=failed)
+            # "Sauvegarder" pendant la synchronisation applique les changements cible par cible
+            os.makedirs(os.path.dirname(CONFIG_PATH), exist_ok=True)
+            config_watcher = ConfigWatcher(CONFIG_PATH, observer, lambda path: SyncConfig.from_yaml(path, validate=False))
             try:
-                for config in configs:
-                    try:
-                        sync_manager = GitSyncManager(config)
-                        sync_managers.append(sync_manager)
-                        event_handler = FileChangeHandler(sync_manager)
-                        for path in config.watch_paths:
-                            observer.schedule(event_handler, path, recursive=True)
-                            self.append_console(f"{self.texts['watching_dir']}: {path} (repo: {config.github_repo})")
-                        self.append_console(f"✅ {config.local_path} prêt pour la synchronisation.")
-                    except Exception as e:
-                        err_msg = f"❌ {config.local_path} : {e}"
-                        self.show_error(err_msg)
-                if not sync_managers:
-                    self.append_console("Aucune cible valide pour la synchronisation.")
-                    return
                 observer.start()
+                targets.start(configs)
+                if not targets.running:
+                    self.append_console("Aucune cible valide pour la synchronisation.")
+                stats = router.stats()
+                self.append_console(f"{stats['watches']} surveillance(s) pour {stats['watch_paths']} chemin(s)")
                 self.append_console(self.texts["monitoring_started"])
                 while True:
                     time.sleep(1)
+                    new_configs = config_watcher.poll()
+                    if new_configs is not None:
+                        targets.apply(new_configs)
             except Exception as e:
                 err_msg = f"{self.texts['error']}: {e}"
                 self.show_error(err_msg)
@@ -406,8 +477,10 @@ class SyncConfigGUI(tk.Tk):
                 observer.stop()
                 if observer.is_alive():
                     observer.join()
+                router.stop()
+                for sync_manager in targets.managers:
+                    sync_manager.stop()
 
-        import threading
         threading.Thread(target=sync_thread, daemon=True).start()
 
     def toggle_language(self):
@@ -0,0 +1,138 @@
+import os
+import time
+import logging
+from watchdog.events import FileSystemEventHandler
+from .startup import DEFAULT_STARTUP_WORKERS, start_targets
+from .polling_observer import polling_for
+from .watcher import FileChangeHandler
+
+
+def target_key(config):
+    """Targets are identified by their working tree"""
+    return os.path.normcase(os.path.abspath(config.local_path))
+
+
+class ConfigWatcher(FileSystemEventHandler):
+    """Notice edits of the configuration file.
+
+    The directory of the file is watched (editors often replace the file
+    rather than writing it in place). `poll` returns the reloaded targets
+    once the file stayed quiet for `quiet_delay` seconds and its content
+    stamp changed, None otherwise or when the new file is invalid.
+    """
+
+    def __init__(self, path, observer, loader, quiet_delay=1.0):
+        self.path = os.path.abspath(path)
+        self.loader = loader
+        self.quiet_delay = quiet_delay
+        self.logger = logging.getLogger(__name__)
+        self._changed_at = None
+        self._stamp = self._read_stamp()
+        self.watch = observer.schedule(self, os.path.dirname(self.path), recursive=False)
+
+    def _read_stamp(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_size, st.st_mtime_ns
+
+    def dispatch(self, event):
+        paths = [event.src_path, getattr(event, "dest_path", "")]
+        if any(p and os.path.abspath(p) == self.path for p in paths):
+            self._changed_at = time.monotonic()
+
+    def poll(self):
+        if self._changed_at is None or time.monotonic() - self._changed_at < self.quiet_delay:
+            return None
+        self._changed_at = None
+        stamp = self._read_stamp()
+        if stamp is None or stamp == self._stamp:
+            return None
+        self._stamp = stamp
+        try:
+            return self.loader(self.path)
+        except Exception as e:
+            self.logger.error(f"Could not reload {self.path}, keeping the running targets: {e}")
+            return None
+
+
+class TargetSet:
+    """Running targets of a runner, started, stopped or reconfigured one by one"""
+
+    def __init__(self, router, metrics=None, on_ready=None, on_error=None, jobs=None):
+        self.router = router
+        self.metrics = metrics
+        self.on_ready = on_ready
+        self.on_error = on_error
+        self.jobs = jobs or DEFAULT_STARTUP_WORKERS
+        self.logger = logging.getLogger(__name__)
+        # key -> (sync manager, event handler)
+        self.running = {}
+
+    @property
+    def managers(self):
+        return [manager for manager, _ in self.running.values()]
+
+    def _ready(self, config, sync_manager):
+        # Each target is watched as soon as it is ready
+        handler = FileChangeHandler(sync_manager)
+        self.running[target_key(config)] = (sync_manager, handler)
+        if self.metrics is not None:
+            self.metrics.add(sync_manager)
+        for path in config.watch_paths:
+            self.router.add(path, handler, polling=polling_for(config, path))
+            self.logger.info(f"Watching directory: {path} (repo: {config.github_repo})")
+        if self.on_ready:
+            self.on_ready(config, sync_manager)
+
+    def start(self, configs):
+        start_targets(configs, self._ready, self.on_error, max_workers=self.jobs)
+
+    def _stop_target(self, key):
+        sync_manager, handler = self.running.pop(key)
+        self.router.remove(handler)
+        if self.metrics is not None:
+            self.metrics.remove(sync_manager)
+        sync_manager.stop()
+
+    def stop(self):
+        for key in list(self.running):
+            self._stop_target(key)
+
+    def apply(self, configs):
+        """Bring the running targets in line with `configs`"""
+        wanted = {target_key(config): config for config in configs}
+        to_stop, to_start, reconfigured = [], [], 0
+        for key in self.running:
+            if key not in wanted:
+                to_stop.append(key)
+        for key, config in wanted.items():
+            if key not in self.running:
+                to_start.append(config)
+                continue
+            sync_manager, handler = self.running[key]
+            if sync_manager.config == config:
+                continue
+            try:
+                config.validate(check_github=False)
+            except ValueError as e:
+                self.logger.error(f"Invalid new configuration for {config.local_path}, keeping the old one: {e}")
+                continue
+            old_paths = sync_manager.config.watch_paths
+            if sync_manager.reconfigure(config):
+                reconfigured += 1
+                if config.watch_paths != old_paths:
+                    self.router.remove(handler)
+                    for path in config.watch_paths:
+                        self.router.add(path, handler, polling=polling_for(config, path))
+            else:
+                to_stop.append(key)
+                to_start.append(config)
+        for key in to_stop:
+            self._stop_target(key)
+        if to_start:
+            self.start(to_start)
+        self.logger.info(
+            f"Configuration reloaded: {len(to_start)} target(s) started, {len(to_stop)} stopped, "
+            f"{reconfigured} reconfigured, {len(self.running)} running")
@@ -0,0 +1,301 @@
+import os
+import re
+import logging
+
+# Always ignored, whatever the repository says
+DEFAULT_IGNORE = [
+    ".git/",
+    "*.swp",
+    "*.swx",
+    "*~",
+    ".#*",
+    "4913",
+]
+
+_GLOB_CHARS = re.compile(r"[*?\[]")
+
+
+def resolve_path(path):
+    """Resolve symlinks in the parents of `path`, but not the path itself"""
+    head, tail = os.path.split(os.path.abspath(path))
+    return os.path.join(os.path.realpath(head), tail)
+
+
+def _translate(pattern):
+    """Translate a gitignore glob into a regex (without anchors)"""
+    i, n = 0, len(pattern)
+    out = []
+    while i < n:
+        c = pattern[i]
+        if c == "*":
+            if pattern[i:i + 3] == "**/":
+                out.append("(?:.*/)?")
+                i += 3
+                continue
+            if pattern[i:i + 2] == "**" and i + 2 == n:
+                out.append(".*")
+                i += 2
+                continue
+            out.append("[^/]*")
+        elif c == "?":
+            out.append("[^/]")
+        elif c == "[":
+            j = pattern.find("]", i + 2)
+            if j == -1:
+                out.append(re.escape(c))
+            else:
+                body = pattern[i + 1:j]
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                out.append("[" + body.replace("\\", "\\\\") + "]")
+                i = j
+        elif c == "\\" and i + 1 < n:
+            i += 1
+            out.append(re.escape(pattern[i]))
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return "".join(out)
+
+
+def _combine(regexes):
+    if not regexes:
+        return None
+    return re.compile("|".join(f"(?:{r})" for r in regexes))
+
+
+class RuleSet:
+    """Patterns of one ignore source, compiled into a lookup index.
+
+    Literal patterns end up in sets, globs are merged into one regex per kind.
+    Sources using negation ("!pattern") keep an ordered list instead, since
+    the last matching pattern wins there.
+    """
+
+    def __init__(self, lines, base=""):
+        self.base = base
+        self.rules = []
+        for line in lines:
+            rule = self._parse(line)
+            if rule:
+                self.rules.append(rule)
+        self.has_negation = any(rule[0] for rule in self.rules)
+
+        names, dir_names, paths, dir_paths = set(), set(), set(), set()
+        name_globs, dir_name_globs, path_globs, dir_path_globs = [], [], [], []
+        for _, dir_only, anchored, pattern, _ in self.rules:
+            literal = not _GLOB_CHARS.search(pattern) and "\\" not in pattern
+            if anchored:
+                literals = dir_paths if dir_only else paths
+                globs = dir_path_globs if dir_only else path_globs
+            else:
+                literals = dir_names if dir_only else names
+                globs = dir_name_globs if dir_only else name_globs
+            if literal:
+                literals.add(pattern)
+            else:
+                globs.append(_translate(pattern))
+        self._names, self._dir_names = names, dir_names
+        self._paths, self._dir_paths = paths, dir_paths
+        self._name_re = _combine(name_globs)
+        self._dir_name_re = _combine(dir_name_globs)
+        self._path_re = _combine(path_globs)
+        self._dir_path_re = _combine(dir_path_globs)
+
+    @staticmethod
+    def _parse(line):
+        line = line.rstrip("\n").rstrip("\r")
+        if not line or line.startswith("#"):
+            return None
+        # Trailing spaces are ignored unless escaped
+        stripped = line.rstrip(" ")
+        if stripped.endswith("\\") and len(stripped) < len(line):
+            stripped += " "
+        line = stripped
+        negate = line.startswith("!")
+        if negate:
+            line = line[1:]
+        elif line.startswith("\\!") or line.startswith("\\#"):
+            line = line[1:]
+        dir_only = line.endswith("/")
+        line = line.rstrip("/")
+        if not line:
+            return None
+        anchored = "/" in line
+        line = line.lstrip("/")
+        regex = re.compile(_translate(line))
+        return negate, dir_only, anchored, line, regex
+
+    def match(self, rel, is_dir):
+        """True (ignored), False (re-included) or None (no opinion)"""
+        name = rel.rsplit("/", 1)[-1]
+        if not self.has_negation:
+            if name in self._names or rel in self._paths:
+                return True
+            if self._name_re and self._name_re.fullmatch(name):
+                return True
+            if self._path_re and self._path_re.fullmatch(rel):
+                return True
+            if is_dir:
+                if name in self._dir_names or rel in self._dir_paths:
+                    return True
+                if self._dir_name_re and self._dir_name_re.fullmatch(name):
+                    return True
+                if self._dir_path_re and self._dir_path_re.fullmatch(rel):
+                    return True
+            return None
+        for negate, dir_only, anchored, _, regex in reversed(self.rules):
+            if dir_only and not is_dir:
+                continue
+            if regex.fullmatch(rel if anchored else name):
+                return not negate
+        return None
+
+
+def is_cone(patterns):
+    """Whether sparse-checkout patterns are plain directories (cone mode)"""
+    return not any(c in p for p in patterns for c in "*?[!")
+
+
+class SparseCone:
+    """Paths checked out by a cone-mode sparse checkout of `dirs`.
+
+    Cone mode keeps everything below the listed directories, plus the files
+    directly inside the repository root and inside their parent directories.
+    """
+
+    def __init__(self, dirs):
+        self.dirs = [d.strip("/") for d in dirs if d.strip("/")]
+        self.parents = {""}
+        for d in self.dirs:
+            parts = d.split("/")
+            for i in range(1, len(parts)):
+                self.parents.add("/".join(parts[:i]))
+
+    def contains(self, rel, is_dir=False):
+        for d in self.dirs:
+            if rel == d or rel.startswith(d + "/"):
+                return True
+        if is_dir:
+            return rel in self.parents
+        return rel.rpartition("/")[0] in self.parents
+
+
+class IgnoreMatcher:
+    """Decide whether a watched path should be ignored.
+
+    Sources, from lowest to highest priority: DEFAULT_IGNORE,
+    .git/info/exclude, the .gitignore files of the repository (deeper files
+    win) and the per-target `ignore` list of the configuration. With a
+    cone-mode sparse checkout, paths outside of the cone are ignored too.
+    """
+
+    def __init__(self, root, patterns=None, watch_paths=None, sparse_paths=None):
+        self.root = os.path.realpath(root)
+        self.patterns = list(patterns or [])
+        self.watch_paths = [os.path.realpath(p) for p in (watch_paths or [])]
+        self.sparse = SparseCone(sparse_paths) if sparse_paths and is_cone(sparse_paths) else None
+        self.logger = logging.getLogger(__name__)
+        self.rebuild()
+
+    def rebuild(self):
+        """Reload every ignore source, walking the tree for .gitignore files"""
+        self._defaults = RuleSet(DEFAULT_IGNORE)
+        self._config = RuleSet(self.patterns)
+        self._exclude = RuleSet(self._read(os.path.join(self.root, ".git", "info", "exclude")))
+        self._gitignores = {}
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            rel_dir = self._relative(dirpath)
+            if ".gitignore" in filenames:
+                self._load_gitignore(rel_dir)
+            # Do not descend into ignored directories
+            dirnames[:] = [
+                d for d in dirnames
+                if not self.is_ignored_rel(f"{rel_dir}/{d}" if rel_dir else d, True)
+            ]
+
+    def _read(self, path):
+        try:
+            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                return f.readlines()
+        except OSError:
+            return []
+
+    def _load_gitignore(self, rel_dir):
+        path = os.path.join(self.root, rel_dir, ".gitignore")
+        lines = self._read(path)
+        if lines:
+            self._gitignores[rel_dir] = RuleSet(lines, rel_dir)
+        else:
+            self._gitignores.pop(rel_dir, None)
+
+    def _relative(self, path):
+        rel = os.path.relpath(path, self.root).replace(os.sep, "/")
+        return "" if rel == "." else rel
+
+    def is_ignore_file(self, path):
+        """Whether a change to `path` requires reloading ignore rules"""
+        return (os.path.basename(path) == ".gitignore" or
+                resolve_path(path) == os.path.join(self.root, ".git", "info", "exclude"))
+
+    def reload_file(self, path):
+        path = resolve_path(path)
+        if os.path.basename(path) == ".gitignore":
+            rel_dir = self._relative(os.path.dirname(path))
+            if not rel_dir.startswith(".."):
+                self._load_gitignore(rel_dir)
+        else:
+            self._exclude = RuleSet(self._read(path))
+        self.logger.info(f"Reloaded ignore rules from {path}")
+
+    def is_ignored(self, path, is_dir=False):
+        path = resolve_path(path)
+        try:
+            rel = os.path.relpath(path, self.root)
+        except ValueError:
+            rel = os.pardir
+        if not rel.startswith(os.pardir):
+            return self.is_ignored_rel(self._relative(path), is_dir)
+        # Outside of the repository: only default and configured patterns apply
+        for watch_path in self.watch_paths:
+            if path == watch_path or path.startswith(watch_path + os.sep):
+                rel = os.path.relpath(path, watch_path).replace(os.sep, "/")
+                return self._check(rel, is_dir, (self._defaults,), {})
+        return False
+
+    def is_ignored_rel(self, rel, is_dir=False):
+        if not rel:
+            return False
+        if self.sparse is not None and not self.sparse.contains(rel, is_dir):
+            return True
+        return self._check(rel, is_dir, (self._defaults, self._exclude), self._gitignores)
+
+    def _check(self, rel, is_dir, low, gitignores):
+        parts = rel.split("/")
+        for i in range(1, len(parts) + 1):
+            sub = "/".join(parts[:i])
+            sub_is_dir = is_dir or i < len(parts)
+            # A path inside an ignored directory can not be re-included
+            if self._match(sub, sub_is_dir, parts[:i - 1], low, gitignores):
+                return True
+        return False
+
+    def _match(self, sub, is_dir, parents, low, gitignores):
+        result = None
+        for ruleset in low:
+            r = ruleset.match(sub, is_dir)
+            if r is not None:
+                result = r
+        if gitignores:
+            bases = [""] + ["/".join(parents[:j]) for j in range(1, len(parents) + 1)]
+            for base in bases:
+                ruleset = gitignores.get(base)
+                if ruleset is None:
+                    continue
+                r = ruleset.match(sub[len(base) + 1:] if base else sub, is_dir)
+                if r is not None:
+                    result = r
+        r = self._config.match(sub, is_dir)
+        if r is not None:
+            result = r
+        return bool(result)
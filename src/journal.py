@@ -0,0 +1,212 @@
+"""Durable journal of the changes of one target.
+
+Every event taken by the change queue is appended to a SQLite database in
+WAL mode in the git directory, together with the outcome of each sync
+batch. Events are buffered in memory and written by a background thread
+every `group_delay` seconds, one transaction (and one fsync) per group.
+On startup the manager replays the events no successful sync covered,
+instead of re-adding or resetting the whole working tree.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+# Written in the git directory of the target
+JOURNAL_FILE = "gitsync-journal.db"
+
+SYNCED = "synced"
+FAILED = "failed"
+# Synced entries are deleted every this many outcomes
+COMPACT_EVERY = 100
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    seq INTEGER PRIMARY KEY,
+    path TEXT,  -- NULL when events were dropped (overflow)
+    kind TEXT NOT NULL,
+    at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS outcomes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    first_seq INTEGER NOT NULL,
+    last_seq INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    detail TEXT,
+    at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+_UNFINISHED = """
+SELECT seq, path, kind FROM events e WHERE NOT EXISTS (
+    SELECT 1 FROM outcomes o
+    WHERE o.status = 'synced' AND e.seq BETWEEN o.first_seq AND o.last_seq
+) ORDER BY seq
+"""
+
+
+def journal_path(repo_path):
+    return os.path.join(repo_path, '.git', JOURNAL_FILE)
+
+
+class SyncJournal:
+    """Append-only event and outcome log with group commit"""
+
+    def __init__(self, path, group_delay=0.2):
+        self.path = path
+        self.group_delay = group_delay
+        self.logger = logging.getLogger(__name__)
+        self.existed = os.path.exists(path)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        # Each group commit is fsync'ed
+        self._db.execute("PRAGMA synchronous=FULL")
+        self._db.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._events = []
+        self._outcomes = []
+        self._state = {}
+        self._seq = self._db.execute("SELECT COALESCE(MAX(seq), 0) FROM events").fetchone()[0]
+        self._drained = self._seq
+
+        # Counters
+        self.events_written = 0
+        self.group_commits = 0
+        self.replayed = 0
+        self._outcomes_since_compact = 0
+
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="journal", daemon=True)
+        self._thread.start()
+
+    def append(self, path, kind):
+        """Record an event, `path` None for dropped events; written with the next group"""
+        with self._lock:
+            self._seq += 1
+            self._events.append((self._seq, path, kind, time.time()))
+
+    def cut(self):
+        """Sequence range of the events appended since the last cut, None if empty"""
+        with self._lock:
+            if self._seq == self._drained:
+                return None
+            first, self._drained = self._drained + 1, self._seq
+            return first, self._seq
+
+    def finish(self, seq_range, ok, detail=None):
+        """Record the outcome of the batch `seq_range` and commit it with its events"""
+        if seq_range is None:
+            return
+        with self._lock:
+            self._outcomes.append((*seq_range, SYNCED if ok else FAILED, detail, time.time()))
+            self._outcomes_since_compact += 1
+            compact = self._outcomes_since_compact >= COMPACT_EVERY
+        self.commit()
+        if compact:
+            self.compact()
+
+    def set_state(self, key, value):
+        with self._lock:
+            self._state[key] = value
+
+    def get_state(self, key):
+        with self._lock:
+            if key in self._state:
+                return self._state[key]
+        with self._db_lock:
+            row = self._db.execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def replay(self, requeue):
+        """Hand the events of the previous runs no sync covered to `requeue(path, kind)`.
+
+        `requeue` journals them again as events of this run, the old entries
+        are only deleted once the new ones are written.
+        """
+        self.commit()
+        with self._lock:
+            before = self._seq
+        with self._db_lock:
+            rows = self._db.execute(_UNFINISHED).fetchall()
+        # Latest kind per path, in event order
+        entries = {}
+        for _, path, kind in rows:
+            entries.pop(path, None)
+            entries[path] = kind
+        for path, kind in entries.items():
+            requeue(path, kind)
+        self.commit()
+        with self._db_lock, self._db:
+            self._db.execute("DELETE FROM events WHERE seq <= ?", (before,))
+            self._db.execute("DELETE FROM outcomes WHERE last_seq <= ?", (before,))
+        self.replayed += len(entries)
+        return len(entries)
+
+    def commit(self):
+        """Write the buffered events, outcomes and state in one transaction"""
+        with self._lock:
+            events, self._events = self._events, []
+            outcomes, self._outcomes = self._outcomes, []
+            state, self._state = self._state, {}
+        if not (events or outcomes or state):
+            return
+        with self._db_lock:
+            try:
+                with self._db:
+                    self._db.executemany("INSERT INTO events (seq, path, kind, at) VALUES (?, ?, ?, ?)", events)
+                    self._db.executemany(
+                        "INSERT INTO outcomes (first_seq, last_seq, status, detail, at) VALUES (?, ?, ?, ?, ?)",
+                        outcomes)
+                    self._db.executemany("INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)", state.items())
+            except sqlite3.Error as e:
+                # Kept for the next group, the events are still in the change queue
+                self.logger.error(f"Could not write the journal {self.path}: {e}")
+                with self._lock:
+                    self._events[:0] = events
+                    self._outcomes[:0] = outcomes
+                    self._state = {**state, **self._state}
+                return
+        self.events_written += len(events)
+        self.group_commits += 1
+
+    def compact(self):
+        """Delete the events a successful sync covered"""
+        with self._lock:
+            self._outcomes_since_compact = 0
+        with self._db_lock:
+            try:
+                with self._db:
+                    self._db.execute(
+                        "DELETE FROM events WHERE EXISTS (SELECT 1 FROM outcomes o WHERE o.status = ? "
+                        "AND events.seq BETWEEN o.first_seq AND o.last_seq)", (SYNCED,))
+                    self._db.execute("DELETE FROM outcomes WHERE status = ?", (SYNCED,))
+            except sqlite3.Error as e:
+                self.logger.warning(f"Could not compact the journal {self.path}: {e}")
+
+    def _run(self):
+        while not self._stop.wait(self.group_delay):
+            self.commit()
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+        self.commit()
+        self.compact()
+        with self._db_lock:
+            self._db.close()
+
+    def stats(self):
+        with self._lock:
+            buffered = len(self._events)
+        return {
+            "journal_events_written": self.events_written,
+            "journal_group_commits": self.group_commits,
+            "journal_buffered_events": buffered,
+            "journal_replayed": self.replayed,
+        }
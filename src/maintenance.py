@@ -0,0 +1,141 @@
+import logging
+import shutil
+import subprocess
+import sys
+import threading
+import time
+
+# At most one target is maintained at a time in a process
+_RUN_LOCK = threading.Lock()
+
+# Run in this order, each a git command
+TASKS = [
+    ("commit-graph", ["commit-graph", "write", "--reachable", "--split"]),
+    ("loose-objects", ["maintenance", "run", "--task=loose-objects"]),
+    ("incremental-repack", ["maintenance", "run", "--task=incremental-repack"]),
+    ("prune", ["prune", "--expire=2.weeks.ago"]),
+]
+
+
+def low_priority_prefix():
+    """Command prefix running git at idle CPU and IO priority, where available"""
+    prefix = []
+    if sys.platform == "win32":
+        return prefix
+    if shutil.which("nice"):
+        prefix += ["nice", "-n", "19"]
+    if shutil.which("ionice"):
+        prefix += ["ionice", "-c", "3"]
+    return prefix
+
+
+def count_objects(path):
+    """`git count-objects -v` as a dict of ints (sizes in KiB)"""
+    out = subprocess.run(["git", "count-objects", "-v"], cwd=path, capture_output=True, text=True).stdout
+    counts = {}
+    for line in out.splitlines():
+        key, _, value = line.partition(":")
+        if value.strip().isdigit():
+            counts[key.strip()] = int(value)
+    return counts
+
+
+class MaintenanceScheduler:
+    """Pack and maintain the repository of one target while it is idle.
+
+    Every `check_interval` seconds, the jobs run when the target synced
+    nothing for `idle` seconds, has no pending changes, and was last
+    maintained at least `interval` seconds ago. Jobs run at low CPU/IO
+    priority, one target at a time across the process.
+    """
+
+    def __init__(self, sync_manager, idle=300, interval=86400, check_interval=60):
+        self.sync_manager = sync_manager
+        self.idle = idle
+        self.interval = interval
+        self.check_interval = check_interval
+        self.logger = logging.getLogger(__name__)
+        self._stop = threading.Event()
+        self._thread = None
+        self._last_run = 0.0
+
+        # Counters
+        self.runs = 0
+        self.failures = 0
+        self.last_duration = None
+        self.last_counts = {}
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            name = f"maintenance-{self.sync_manager.config.github_repo}"
+            self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=None):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(min(self.check_interval, self.idle)):
+            if not self.is_due():
+                continue
+            # Wait for the target being maintained elsewhere, then look again
+            with _RUN_LOCK:
+                if not self._stop.is_set() and self.is_due():
+                    self.run()
+
+    def is_due(self):
+        manager = self.sync_manager
+        if time.time() - self._last_run < self.interval:
+            return False
+        return manager.changes.due_in() is None and time.time() - manager.last_sync >= self.idle
+
+    def run(self):
+        """Run every job once, returns True when they all succeeded"""
+        path = self.sync_manager.config.local_path
+        self._last_run = time.time()
+        before = count_objects(path)
+        started = time.perf_counter()
+        prefix = low_priority_prefix()
+        # Windows has no nice, the process class does the same
+        kwargs = {"creationflags": subprocess.IDLE_PRIORITY_CLASS} if sys.platform == "win32" else {}
+        ok = True
+        for name, args in TASKS:
+            if self._stop.is_set():
+                break
+            result = subprocess.run([*prefix, "git", *args], cwd=path, capture_output=True, text=True, **kwargs)
+            if result.returncode != 0:
+                ok = False
+                self.logger.warning(f"Maintenance task {name} failed in {path}: {result.stderr.strip()}")
+        self.last_duration = time.perf_counter() - started
+        after = count_objects(path)
+        self.last_counts = after
+        self.runs += 1
+        if not ok:
+            self.failures += 1
+        self.logger.info(
+            f"Maintained {path} in {self.last_duration:.1f}s: "
+            f"loose objects {before.get('count', 0)} -> {after.get('count', 0)}, "
+            f"packs {before.get('packs', 0)} -> {after.get('packs', 0)}, "
+            f"pack size {before.get('size-pack', 0)} -> {after.get('size-pack', 0)} KiB, "
+            f"loose size {before.get('size', 0)} -> {after.get('size', 0)} KiB")
+        return ok
+
+    def stats(self):
+        stats = {
+            "maintenance_runs": self.runs,
+            "maintenance_failures": self.failures,
+        }
+        if self.runs:
+            # Repository state after the last run
+            stats.update({
+                "maintenance_last_seconds": self.last_duration,
+                "loose_objects": self.last_counts.get("count", 0),
+                "packs": self.last_counts.get("packs", 0),
+                "pack_size_kib": self.last_counts.get("size-pack", 0),
+            })
+        return stats
@@ -0,0 +1,302 @@
+import json
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import git
+
+# Histogram buckets in seconds, from a quick local git call to a slow push
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        with self._lock:
+            self.count += 1
+            self.sum += value
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.counts[i] += 1
+                    break
+
+    def snapshot(self):
+        """(cumulative bucket counts, count, sum)"""
+        with self._lock:
+            cumulative, total = [], 0
+            for n in self.counts:
+                total += n
+                cumulative.append(total)
+            return cumulative, self.count, self.sum
+
+
+class TargetMetrics:
+    """Latency histograms of one GitSyncManager, counters come from its stats()"""
+
+    def __init__(self):
+        self.event_to_commit = Histogram()
+        self.commit_to_push = Histogram()
+        self.git_commands = {}
+        self._lock = threading.Lock()
+        self.last_success = None
+
+    def observe_git(self, command, seconds):
+        with self._lock:
+            histogram = self.git_commands.get(command)
+            if histogram is None:
+                histogram = self.git_commands[command] = Histogram()
+        histogram.observe(seconds)
+
+    def mark_success(self):
+        self.last_success = time.time()
+
+
+def _command_name(command):
+    if isinstance(command, str):
+        command = command.split()
+    args = iter(command[1:])
+    for arg in args:
+        if arg in ('-c', '-C'):
+            next(args, None)
+        elif not str(arg).startswith('-'):
+            return str(arg)
+    return 'git'
+
+
+class InstrumentedGit(git.cmd.Git):
+    """git command wrapper reporting the duration of every git process"""
+
+    __slots__ = ('_observer',)
+
+    def __init__(self, working_dir=None, observer=None):
+        super().__init__(working_dir)
+        self._observer = observer
+
+    def execute(self, command, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().execute(command, *args, **kwargs)
+        finally:
+            if self._observer is not None and not kwargs.get('as_process'):
+                self._observer(_command_name(command), time.perf_counter() - start)
+
+
+# name -> (type, help, stats key)
+_STATS_METRICS = [
+    ("gitsync_events_total", "counter", "File events received", "events_received"),
+    ("gitsync_events_coalesced_total", "counter", "Events absorbed into a batch synced with others", "events_coalesced"),
+    ("gitsync_events_unchanged_total", "counter", "Modification events dropped because the content did not change", "events_unchanged"),
+    ("gitsync_events_dropped_total", "counter", "Events dropped because the queue was full", "dropped"),
+    ("gitsync_syncs_total", "counter", "Sync batches processed", "batches"),
+    ("gitsync_queue_depth", "gauge", "Events waiting in the worker queue", "queue_depth"),
+    ("gitsync_pending_paths", "gauge", "Distinct paths waiting for the next sync", "pending_paths"),
+    ("gitsync_pushes_total", "counter", "Successful pushes", "pushes"),
+    ("gitsync_push_failures_total", "counter", "Failed push attempts", "push_failures"),
+    ("gitsync_commits_ahead", "gauge", "Local commits not pushed yet", "commits_ahead"),
+    ("gitsync_remote_polls_total", "counter", "Remote branch polls", "remote_polls"),
+    ("gitsync_remote_updates_total", "counter", "Remote changes applied", "remote_updates"),
+    ("gitsync_maintenance_runs_total", "counter", "Idle-time maintenance runs", "maintenance_runs"),
+    ("gitsync_loose_objects", "gauge", "Loose objects after the last maintenance", "loose_objects"),
+    ("gitsync_pack_size_kib", "gauge", "Pack size in KiB after the last maintenance", "pack_size_kib"),
+]
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(**labels):
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _format_bound(bound):
+    return f"{bound:g}"
+
+
+class MetricsRegistry:
+    """Collect metrics of every running GitSyncManager"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._managers = []
+
+    def add(self, sync_manager):
+        with self._lock:
+            self._managers.append(sync_manager)
+
+    def remove(self, sync_manager):
+        with self._lock:
+            if sync_manager in self._managers:
+                self._managers.remove(sync_manager)
+
+    def managers(self):
+        with self._lock:
+            return list(self._managers)
+
+    def collect(self):
+        """Plain dict snapshot, used for the JSON dump"""
+        targets = []
+        for manager in self.managers():
+            metrics = manager.metrics
+            entry = {
+                "repo": manager.config.github_repo,
+                "local_path": manager.config.local_path,
+                "stats": manager.stats(),
+                "last_success": metrics.last_success,
+                "histograms": {
+                    "event_to_commit_seconds": self._histogram_dict(metrics.event_to_commit),
+                    "commit_to_push_seconds": self._histogram_dict(metrics.commit_to_push),
+                },
+                "git_command_seconds": {
+                    command: self._histogram_dict(histogram)
+                    for command, histogram in sorted(metrics.git_commands.items())
+                },
+            }
+            targets.append(entry)
+        return {"timestamp": time.time(), "targets": targets}
+
+    @staticmethod
+    def _histogram_dict(histogram):
+        cumulative, count, total = histogram.snapshot()
+        return {
+            "buckets": {_format_bound(b): n for b, n in zip(histogram.buckets, cumulative)},
+            "count": count,
+            "sum": total,
+        }
+
+    def render_prometheus(self):
+        managers = self.managers()
+        snapshots = [(m, m.stats(), _labels(repo=m.config.github_repo, local_path=m.config.local_path))
+                     for m in managers]
+        lines = []
+        for name, kind, help_text, key in _STATS_METRICS:
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+            for _, stats, labels in snapshots:
+                if key in stats:
+                    lines.append(f"{name}{labels} {stats[key]}")
+
+        name = "gitsync_last_success_timestamp_seconds"
+        lines += [f"# HELP {name} Time of the last successful sync", f"# TYPE {name} gauge"]
+        for manager, _, labels in snapshots:
+            if manager.metrics.last_success is not None:
+                lines.append(f"{name}{labels} {manager.metrics.last_success:.3f}")
+
+        for name, help_text, attr in [
+            ("gitsync_event_to_commit_seconds", "Delay between the first event of a batch and its commit", "event_to_commit"),
+            ("gitsync_commit_to_push_seconds", "Delay between a commit and the push publishing it", "commit_to_push"),
+        ]:
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+            for manager, _, _ in snapshots:
+                labels = dict(repo=manager.config.github_repo, local_path=manager.config.local_path)
+                lines += self._render_histogram(name, getattr(manager.metrics, attr), labels)
+
+        name = "gitsync_git_command_seconds"
+        lines += [f"# HELP {name} Duration of git subprocesses by command", f"# TYPE {name} histogram"]
+        for manager, _, _ in snapshots:
+            for command, histogram in sorted(manager.metrics.git_commands.items()):
+                labels = dict(repo=manager.config.github_repo, local_path=manager.config.local_path, command=command)
+                lines += self._render_histogram(name, histogram, labels)
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _render_histogram(name, histogram, labels):
+        cumulative, count, total = histogram.snapshot()
+        lines = []
+        for bound, n in zip(histogram.buckets, cumulative):
+            lines.append(f"{name}_bucket{_labels(**labels, le=_format_bound(bound))} {n}")
+        lines.append(f"{name}_bucket{_labels(**labels, le='+Inf')} {count}")
+        lines.append(f"{name}_sum{_labels(**labels)} {total:.6f}")
+        lines.append(f"{name}_count{_labels(**labels)} {count}")
+        return lines
+
+    def dump_json(self, path):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.collect(), f, indent=2)
+        os.replace(tmp_path, path)
+
+
+class MetricsServer:
+    """Serve /metrics (Prometheus text) and /metrics.json on a local port"""
+
+    def __init__(self, registry, port, host="127.0.0.1"):
+        self.registry = registry
+        self.logger = logging.getLogger(__name__)
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(handler):
+                if handler.path == "/metrics":
+                    body = registry.render_prometheus().encode()
+                    content_type = "text/plain; version=0.0.4; charset=utf-8"
+                elif handler.path == "/metrics.json":
+                    body = json.dumps(registry.collect()).encode()
+                    content_type = "application/json"
+                else:
+                    handler.send_error(404)
+                    return
+                handler.send_response(200)
+                handler.send_header("Content-Type", content_type)
+                handler.send_header("Content-Length", str(len(body)))
+                handler.end_headers()
+                handler.wfile.write(body)
+
+            def log_message(handler, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def port(self):
+        return self.server.server_address[1]
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name="metrics-http", daemon=True)
+        self._thread.start()
+        self.logger.info(f"Metrics served on http://{self.server.server_address[0]}:{self.port}/metrics")
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class MetricsDumper:
+    """Write the JSON snapshot to a file every `interval` seconds"""
+
+    def __init__(self, registry, path, interval=15):
+        self.registry = registry
+        self.path = path
+        self.interval = interval
+        self.logger = logging.getLogger(__name__)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="metrics-dump", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.dump()
+
+    def dump(self):
+        try:
+            self.registry.dump_json(self.path)
+        except OSError as e:
+            self.logger.warning(f"Could not write metrics to {self.path}: {e}")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.dump()
@@ -0,0 +1,246 @@
+"""Mirror watch paths located outside of the repository into it.
+
+Each such watch path is mapped to a subdirectory of the repository (its
+base name unless `mirror_dirs` says otherwise). Changed source paths are
+copied there rsync-style. A file whose size and mtime match its copy is
+skipped. Small files are compared by digest and copied whole. Large files
+are compared block by block, and only the differing blocks are rewritten.
+Deleted sources are deleted from the repository.
+"""
+import json
+import logging
+import os
+import shutil
+import stat
+from dataclasses import replace
+from .digest_cache import file_digest
+from .ignore import resolve_path
+
+# Written in the git directory, destination -> source of every mirrored directory
+MIRROR_FILE = "gitsync-mirror.json"
+# Files from this size on are updated in place block by block
+DELTA_MIN_SIZE = 8 * 1024 * 1024
+BLOCK_SIZE = 128 * 1024
+
+
+def mirror_mappings(root, watch_paths, mirror_dirs=None):
+    """(source, destination) pairs of the watch paths outside of `root`"""
+    root = os.path.realpath(root)
+    dirs = {os.path.realpath(k): v for k, v in (mirror_dirs or {}).items()}
+    mappings = []
+    for path in watch_paths:
+        source = os.path.realpath(path)
+        if source == root or source.startswith(root + os.sep) or root.startswith(source + os.sep):
+            # Inside the repository (or containing it), synced in place
+            continue
+        subdir = dirs.get(source) or os.path.basename(source)
+        mappings.append((source, os.path.join(root, subdir)))
+    return mappings
+
+
+class Mirror:
+    def __init__(self, root, watch_paths, mirror_dirs=None, ignore=None):
+        self.mappings = mirror_mappings(root, watch_paths, mirror_dirs)
+        self.ignore = ignore
+        self.logger = logging.getLogger(__name__)
+
+        # Counters
+        self.files_copied = 0
+        self.files_skipped = 0
+        self.files_deleted = 0
+        self.bytes_written = 0
+        self.bytes_skipped = 0
+
+    def claim(self, state_path, tracked_files):
+        """Check that each destination belongs to its source, then record it.
+
+        A destination already holding tracked files that were not mirrored
+        from this source would be wiped by the first full sync, so it is
+        refused. `tracked_files(dest)` lists the tracked files under `dest`.
+        """
+        try:
+            with open(state_path, encoding="utf-8") as f:
+                owners = json.load(f)
+        except (OSError, ValueError):
+            owners = {}
+        for source, dest in self.mappings:
+            owner = owners.get(dest)
+            if owner == source:
+                continue
+            if owner is not None or tracked_files(dest):
+                raise ValueError(
+                    f"{dest} already holds files not mirrored from {source}, mirroring it would delete "
+                    f"them: choose another mirror_dirs entry (owners are recorded in {state_path})")
+            owners[dest] = source
+        tmp_path = f"{state_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(owners, f, indent=2)
+        os.replace(tmp_path, state_path)
+
+    def destination(self, path):
+        """Repository path of a source path, None when `path` is not mirrored"""
+        path = resolve_path(path)
+        for source, dest in self.mappings:
+            if path == source:
+                return dest
+            if path.startswith(source + os.sep):
+                return os.path.join(dest, os.path.relpath(path, source))
+        return None
+
+    def apply(self, batch, full=False):
+        """Mirror the source paths of `batch`, returns it with their repository paths"""
+        if full:
+            changes = {}
+            for source, dest in self.mappings:
+                for path, kind in self._sync_tree(source, dest):
+                    changes[path] = kind
+            for path, kind in batch.changes.items():
+                if self.destination(path) is None:
+                    changes[path] = kind
+            return replace(batch, changes=changes)
+        changes = {}
+        for path, kind in batch.changes.items():
+            dest = self.destination(path)
+            if dest is None:
+                changes[path] = kind
+                continue
+            for changed, dest_kind in self._sync_path(resolve_path(path), dest):
+                changes[changed] = dest_kind
+        return replace(batch, changes=changes)
+
+    def _sync_path(self, source, dest):
+        try:
+            st = os.lstat(source)
+        except FileNotFoundError:
+            return self._delete(dest)
+        if stat.S_ISDIR(st.st_mode):
+            return self._sync_tree(source, dest)
+        if self._copy(source, dest, st):
+            return [(dest, "modified")]
+        return []
+
+    def _sync_tree(self, source, dest):
+        """Mirror a whole directory, deleting what the source no longer has"""
+        changed = []
+        if os.path.lexists(dest) and not os.path.isdir(dest):
+            changed += self._delete(dest)
+        os.makedirs(dest, exist_ok=True)
+        for dirpath, dirnames, filenames in os.walk(source):
+            rel = os.path.relpath(dirpath, source)
+            target = os.path.normpath(os.path.join(dest, rel))
+            dirnames[:] = [d for d in dirnames if not self._ignored(os.path.join(dirpath, d), True)]
+            kept = set()
+            for name in dirnames:
+                kept.add(name)
+                sub = os.path.join(target, name)
+                if os.path.lexists(sub) and not os.path.isdir(sub):
+                    changed += self._delete(sub)
+                os.makedirs(sub, exist_ok=True)
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                if self._ignored(path, False):
+                    continue
+                kept.add(name)
+                try:
+                    st = os.lstat(path)
+                except FileNotFoundError:
+                    continue
+                if self._copy(path, os.path.join(target, name), st):
+                    changed.append((os.path.join(target, name), "modified"))
+            for name in os.listdir(target):
+                if name not in kept and not self._ignored(os.path.join(dirpath, name), None):
+                    changed += self._delete(os.path.join(target, name))
+        return changed
+
+    def _ignored(self, path, is_dir):
+        if self.ignore is None:
+            return False
+        if is_dir is None:
+            # Gone from the source, ignored under either kind
+            return self.ignore.is_ignored(path, False) or self.ignore.is_ignored(path, True)
+        return self.ignore.is_ignored(path, is_dir)
+
+    def _delete(self, dest):
+        if not os.path.lexists(dest):
+            return []
+        if os.path.isdir(dest) and not os.path.islink(dest):
+            shutil.rmtree(dest)
+        else:
+            os.remove(dest)
+        self.files_deleted += 1
+        return [(dest, "deleted")]
+
+    def _copy(self, source, dest, st):
+        """Bring `dest` up to date with `source`, returns False when it already was"""
+        if stat.S_ISLNK(st.st_mode):
+            link = os.readlink(source)
+            if os.path.islink(dest) and os.readlink(dest) == link:
+                return False
+            if os.path.lexists(dest):
+                self._delete(dest)
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            os.symlink(link, dest)
+            return True
+        if not stat.S_ISREG(st.st_mode):
+            return False
+        try:
+            dst = os.lstat(dest)
+        except FileNotFoundError:
+            dst = None
+        if dst is not None and not stat.S_ISREG(dst.st_mode):
+            self._delete(dest)
+            dst = None
+        if dst is not None and dst.st_size == st.st_size:
+            if dst.st_mtime_ns == st.st_mtime_ns:
+                # Quick check, as rsync does
+                self.files_skipped += 1
+                self.bytes_skipped += st.st_size
+                return False
+            if st.st_size < DELTA_MIN_SIZE and file_digest(source) == file_digest(dest):
+                shutil.copystat(source, dest)
+                self.files_skipped += 1
+                self.bytes_skipped += st.st_size
+                return False
+        if dst is not None and st.st_size >= DELTA_MIN_SIZE:
+            written = self._delta_copy(source, dest, st.st_size)
+            shutil.copystat(source, dest)
+            if not written and dst.st_size == st.st_size:
+                self.files_skipped += 1
+                return False
+        else:
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            tmp_path = f"{dest}.gitsync-tmp"
+            shutil.copy2(source, tmp_path)
+            os.replace(tmp_path, dest)
+            self.bytes_written += st.st_size
+        self.files_copied += 1
+        return True
+
+    def _delta_copy(self, source, dest, size):
+        """Rewrite only the blocks of `dest` that differ from `source`, returns bytes written"""
+        written = 0
+        with open(source, "rb") as src, open(dest, "r+b") as dst:
+            offset = 0
+            while True:
+                block = src.read(BLOCK_SIZE)
+                if not block:
+                    break
+                if dst.read(len(block)) != block:
+                    dst.seek(offset)
+                    dst.write(block)
+                    written += len(block)
+                offset += len(block)
+                dst.seek(offset)
+            dst.truncate(size)
+        self.bytes_written += written
+        self.bytes_skipped += size - written
+        return written
+
+    def stats(self):
+        return {
+            "mirror_files_copied": self.files_copied,
+            "mirror_files_skipped": self.files_skipped,
+            "mirror_files_deleted": self.files_deleted,
+            "mirror_bytes_written": self.bytes_written,
+            "mirror_bytes_skipped": self.bytes_skipped,
+        }
@@ -0,0 +1,206 @@
+"""Polling observer for trees where native file events do not work.
+
+Network mounts (NFS, SMB) deliver no inotify events, and very large trees
+can exhaust the inotify watch limit. The emitter keeps, per directory, the
+sorted entry names and one array of (inode, size, mtime_ns, is_dir) per
+entry. Each poll compares every directory with its previous table. A
+directory whose mtime did not change (and is not too recent to trust) is
+not listed again, only its known entries are stat'ed. The poll interval
+shrinks back to `interval` when something changed. It grows while the tree
+stays idle, and is never shorter than 10 times the last scan duration.
+"""
+import os
+import stat
+import time
+import threading
+from array import array
+from functools import partial
+from watchdog.events import (
+    DirCreatedEvent, DirDeletedEvent, DirMovedEvent,
+    FileCreatedEvent, FileDeletedEvent, FileModifiedEvent, FileMovedEvent,
+)
+from watchdog.observers.api import BaseObserver, EventEmitter
+
+DEFAULT_INTERVAL = 2.0
+DEFAULT_MAX_INTERVAL = 60.0
+# Directory mtimes closer than this to the scan are not trusted (coarse clocks)
+RACY_NS = 2 * 10 ** 9
+# Fields stored per entry
+_INO, _SIZE, _MTIME, _ISDIR = range(4)
+_FIELDS = 4
+
+
+def polling_for(config, path):
+    """Polling intervals of a watch path of `config`, None for native events"""
+    path = os.path.realpath(path)
+    for polled in getattr(config, "polling_paths", None) or []:
+        polled = os.path.realpath(polled)
+        if path == polled or path.startswith(polled.rstrip(os.sep) + os.sep):
+            return config.polling_interval, config.polling_max_interval
+    return None
+
+
+class DirTable:
+    """Entries of one directory: sorted names and a flat array of stat fields"""
+
+    __slots__ = ("mtime_ns", "names", "stats")
+
+    def __init__(self, mtime_ns, names, stats):
+        self.mtime_ns = mtime_ns
+        self.names = names
+        self.stats = stats
+
+    def get(self, i):
+        return self.stats[i * _FIELDS:(i + 1) * _FIELDS]
+
+
+def _entry_fields(st):
+    return (st.st_ino, st.st_size, st.st_mtime_ns, 1 if stat.S_ISDIR(st.st_mode) else 0)
+
+
+class CompactPollingEmitter(EventEmitter):
+    def __init__(self, event_queue, watch, *args, intervals=None, **kwargs):
+        super().__init__(event_queue, watch, *args, **kwargs)
+        self.min_interval, self.max_interval = (intervals or {}).get(
+            watch.path, (DEFAULT_INTERVAL, DEFAULT_MAX_INTERVAL))
+        self.interval = self.min_interval
+        self.root = watch.path
+        self._tables = {}
+        self._lock = threading.Lock()
+
+        # Counters
+        self.scans = 0
+        self.last_scan_seconds = 0.0
+
+    def on_thread_start(self):
+        self._scan(emit=False)
+
+    def queue_events(self, timeout):
+        if self.stopped_event.wait(self.interval):
+            return
+        with self._lock:
+            if not self.should_keep_running():
+                return
+            started = time.perf_counter()
+            changed = self._scan(emit=True)
+            self.last_scan_seconds = time.perf_counter() - started
+        interval = self.min_interval if changed else min(self.interval * 1.5, self.max_interval)
+        self.interval = max(interval, self.last_scan_seconds * 10)
+
+    def _list(self, path, mtime_ns):
+        names, stats = [], array("q")
+        with os.scandir(path) as it:
+            entries = sorted(it, key=lambda e: e.name)
+        for entry in entries:
+            if entry.name == ".git":
+                continue
+            try:
+                st = entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            names.append(entry.name)
+            stats.extend(_entry_fields(st))
+        return DirTable(mtime_ns, tuple(names), stats)
+
+    def _restat(self, path, old, mtime_ns):
+        """Refresh the known entries of an unchanged directory listing"""
+        stats = array("q")
+        for name in old.names:
+            try:
+                st = os.lstat(os.path.join(path, name))
+            except OSError:
+                # Vanished although the listing looked unchanged, list it again
+                return None
+            stats.extend(_entry_fields(st))
+        return DirTable(mtime_ns, old.names, stats)
+
+    def _scan(self, emit):
+        """Walk the tree, update the tables and queue events; returns True on change"""
+        self.scans += 1
+        now_ns = time.time_ns()
+        created, deleted, modified = [], [], []
+        seen = set()
+        stack = [self.root]
+        while stack:
+            path = stack.pop()
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            seen.add(path)
+            old = self._tables.get(path)
+            table = None
+            if old is not None and st.st_mtime_ns == old.mtime_ns and now_ns - st.st_mtime_ns > RACY_NS:
+                table = self._restat(path, old, st.st_mtime_ns)
+            if table is None:
+                try:
+                    table = self._list(path, st.st_mtime_ns)
+                except OSError:
+                    continue
+            self._tables[path] = table
+            if old is not None or path != self.root:
+                self._compare(path, old, table, created, deleted, modified)
+            for i, name in enumerate(table.names):
+                if table.stats[i * _FIELDS + _ISDIR]:
+                    stack.append(os.path.join(path, name))
+
+        # Directories that disappeared with their parent
+        for path in [p for p in self._tables if p not in seen]:
+            del self._tables[path]
+
+        if emit:
+            self._emit(created, deleted, modified)
+        return bool(created or deleted or modified)
+
+    @staticmethod
+    def _compare(path, old, new, created, deleted, modified):
+        old_names = dict(zip(old.names, range(len(old.names)))) if old is not None else {}
+        new_names = set(new.names)
+        for i, name in enumerate(new.names):
+            fields = new.get(i)
+            j = old_names.get(name)
+            if j is None:
+                created.append((os.path.join(path, name), fields))
+                continue
+            before = old.get(j)
+            if before[_ISDIR] != fields[_ISDIR]:
+                deleted.append((os.path.join(path, name), before))
+                created.append((os.path.join(path, name), fields))
+            elif not fields[_ISDIR] and (before[_SIZE], before[_MTIME], before[_INO]) != (
+                    fields[_SIZE], fields[_MTIME], fields[_INO]):
+                modified.append(os.path.join(path, name))
+        for name, j in old_names.items():
+            if name not in new_names:
+                deleted.append((os.path.join(path, name), old.get(j)))
+
+    def _emit(self, created, deleted, modified):
+        # A deletion and a creation of the same inode within one poll is a move
+        by_inode = {fields[_INO]: (p, fields) for p, fields in created if fields[_INO]}
+        moved = set()
+        for src, fields in deleted:
+            match = by_inode.get(fields[_INO])
+            if match is not None and match[1][_ISDIR] == fields[_ISDIR] and match[0] not in moved:
+                moved.add(match[0])
+                cls = DirMovedEvent if fields[_ISDIR] else FileMovedEvent
+                self.queue_event(cls(src, match[0]))
+            else:
+                self.queue_event((DirDeletedEvent if fields[_ISDIR] else FileDeletedEvent)(src))
+        for path, fields in created:
+            if path in moved:
+                continue
+            self.queue_event((DirCreatedEvent if fields[_ISDIR] else FileCreatedEvent)(path))
+        for path in modified:
+            self.queue_event(FileModifiedEvent(path))
+
+
+class CompactPollingObserver(BaseObserver):
+    """Observer scheduling CompactPollingEmitter, with per-path intervals"""
+
+    def __init__(self):
+        self.intervals = {}
+        super().__init__(partial(CompactPollingEmitter, intervals=self.intervals))
+
+    def schedule(self, event_handler, path, recursive=False, interval=DEFAULT_INTERVAL,
+                 max_interval=DEFAULT_MAX_INTERVAL, **kwargs):
+        self.intervals[str(path)] = (interval, max(max_interval, interval))
+        return super().schedule(event_handler, path, recursive=recursive, **kwargs)
@@ -0,0 +1,119 @@
+import logging
+import random
+import threading
+import time
+
+
+class PushScheduler:
+    """Push the commits of one target in batches, off the commit path.
+
+    Commits only call `request`. Pushes happen at most every `min_interval`
+    seconds, so the commits made in between go out together. A failed push
+    is retried with jittered exponential backoff, from `base_backoff` up to
+    `max_backoff` seconds. The scheduler keeps retrying while commits are
+    ahead of the remote.
+    """
+
+    def __init__(self, sync_manager, min_interval=0, max_backoff=300, base_backoff=2):
+        self.sync_manager = sync_manager
+        self.min_interval = min_interval
+        self.max_backoff = max_backoff
+        self.base_backoff = base_backoff
+        self.logger = logging.getLogger(__name__)
+        self._cond = threading.Condition()
+        self._pending = False
+        self._stopping = False
+        self._next_attempt = 0.0
+        self._oldest_unpushed = None
+        self._thread = None
+
+        # Counters
+        self.pushes = 0
+        self.push_failures = 0
+        self.consecutive_failures = 0
+        self.commits_ahead = 0
+        self.last_push = None
+
+    def start(self):
+        if self._thread is None:
+            self._stopping = False
+            name = f"push-{self.sync_manager.config.github_repo}"
+            self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+            self._thread.start()
+
+    def request(self):
+        """Ask for a push of the current branch, called after each commit"""
+        with self._cond:
+            self._pending = True
+            self.commits_ahead += 1
+            if self._oldest_unpushed is None:
+                self._oldest_unpushed = time.monotonic()
+            self._cond.notify()
+
+    def stop(self, timeout=None):
+        """Stop the thread, then try one last push if commits are still ahead"""
+        if self._thread is not None:
+            with self._cond:
+                self._stopping = True
+                self._cond.notify()
+            self._thread.join(timeout)
+            self._thread = None
+        self._refresh_ahead()
+        if self.commits_ahead and not self._push():
+            self.logger.warning(
+                f"{self.commits_ahead} commit(s) of {self.sync_manager.config.local_path} are not pushed")
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stopping:
+                    wait = self._next_attempt - time.monotonic()
+                    if self._pending and wait <= 0:
+                        break
+                    self._cond.wait(wait if self._pending else None)
+                if self._stopping:
+                    return
+                self._pending = False
+            ok = self._push()
+            with self._cond:
+                if ok:
+                    self.consecutive_failures = 0
+                    self._next_attempt = time.monotonic() + self.min_interval
+                else:
+                    self.consecutive_failures += 1
+                    delay = min(self.max_backoff, self.base_backoff * 2 ** (self.consecutive_failures - 1))
+                    self._next_attempt = time.monotonic() + random.uniform(delay / 2, delay)
+                    self._pending = True
+
+    def _push(self):
+        try:
+            self.sync_manager.push()
+        except Exception as e:
+            self.push_failures += 1
+            self.logger.error(f"Push failed for {self.sync_manager.config.github_repo}: {e}")
+            self._refresh_ahead()
+            return False
+        self.pushes += 1
+        self.last_push = time.time()
+        metrics = getattr(self.sync_manager, 'metrics', None)
+        if metrics is not None:
+            if self._oldest_unpushed is not None:
+                metrics.commit_to_push.observe(time.monotonic() - self._oldest_unpushed)
+            metrics.mark_success()
+        self._oldest_unpushed = None
+        self._refresh_ahead()
+        return True
+
+    def _refresh_ahead(self):
+        try:
+            self.commits_ahead = self.sync_manager.commits_ahead()
+        except Exception as e:
+            self.logger.debug(f"Could not count unpushed commits: {e}")
+
+    def stats(self):
+        return {
+            "pushes": self.pushes,
+            "push_failures": self.push_failures,
+            "commits_ahead": self.commits_ahead,
+            "last_push": self.last_push,
+        }
@@ -0,0 +1,68 @@
+import logging
+import threading
+
+
+class RemotePoller:
+    """Periodically check the remote branch of a remote-dominance target.
+
+    Each poll only asks the remote for its branch tip (ls-remote); the
+    fetch/reset runs when that tip differs from the last applied commit.
+    The interval doubles while the remote stays idle, up to `max_interval`,
+    and drops back to `interval` as soon as a change is seen.
+    """
+
+    def __init__(self, sync_manager, interval, max_interval):
+        self.sync_manager = sync_manager
+        self.min_interval = interval
+        self.max_interval = max(max_interval, interval)
+        self.interval = interval
+        self.logger = logging.getLogger(__name__)
+        self._stop = threading.Event()
+        self._thread = None
+
+        # Counters
+        self.polls = 0
+        self.updates = 0
+        self.errors = 0
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            name = f"poll-{self.sync_manager.config.github_repo}"
+            self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=None):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.poll()
+
+    def poll(self):
+        """Poll once, returns True when remote changes were applied"""
+        self.polls += 1
+        try:
+            changed = self.sync_manager.poll_remote()
+        except Exception as e:
+            self.errors += 1
+            self.logger.warning(f"Remote poll failed for {self.sync_manager.config.github_repo}: {e}")
+            changed = False
+        if changed:
+            self.updates += 1
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.interval * 2, self.max_interval)
+        return changed
+
+    def stats(self):
+        return {
+            "remote_polls": self.polls,
+            "remote_updates": self.updates,
+            "remote_poll_errors": self.errors,
+            "remote_poll_interval": self.interval,
+        }
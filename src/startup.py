@@ -0,0 +1,40 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from .git_sync import GitSyncManager
+
+# Targets initialized at the same time (GitHub API calls, clones, initial sync)
+DEFAULT_STARTUP_WORKERS = 8
+
+
+def start_target(config, validate=True):
+    if validate:
+        config.validate()
+    return GitSyncManager(config)
+
+
+def start_targets(configs, on_ready, on_error=None, max_workers=DEFAULT_STARTUP_WORKERS, validate=True):
+    """Validate and initialize every target in a bounded thread pool.
+
+    `on_ready(config, sync_manager)` is called as soon as a target is ready,
+    so it can be watched while the others are still starting. A failing
+    target is passed to `on_error(config, exception)` and does not stop the
+    rest. Returns the list of started managers.
+    """
+    logger = logging.getLogger(__name__)
+    sync_managers = []
+    if not configs:
+        return sync_managers
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(configs)), thread_name_prefix="startup") as pool:
+        futures = {pool.submit(start_target, config, validate): config for config in configs}
+        for future in as_completed(futures):
+            config = futures[future]
+            try:
+                sync_manager = future.result()
+            except Exception as e:
+                logger.error(f"Could not start {config.github_repo} ({config.local_path}): {e}")
+                if on_error:
+                    on_error(config, e)
+                continue
+            sync_managers.append(sync_manager)
+            on_ready(config, sync_manager)
+    return sync_managers
@@ -0,0 +1,77 @@
+import os
+import re
+import subprocess
+import sys
+import time
+
+# Modules loaded by the CLI sync path, in the order main.py needs them
+CLI_MODULES = ["yaml", "watchdog.observers", "git", "src.config", "src.startup", "src.watcher"]
+GUI_MODULES = ["tkinter", "src.gui"]
+
+# Cold-start budget for the CLI sync path, in milliseconds
+DEFAULT_IMPORT_BUDGET_MS = 500
+
+_IMPORTTIME = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def measure_imports(modules):
+    """Run `python -X importtime` in a fresh interpreter.
+
+    Returns a list of (module, self_us, cumulative_us, depth) in import order.
+    Frozen executables can not re-run the interpreter, they time the top-level
+    imports in-process instead (depth 0 only).
+    """
+    if getattr(sys, 'frozen', False):
+        return _measure_in_process(modules)
+    # Modules loaded by the interpreter itself (site, encodings...) are left out
+    baseline = {row[0] for row in _importtime("pass")}
+    rows = _importtime("; ".join(f"import {module}" for module in modules))
+    return [row for row in rows if row[0] not in baseline]
+
+
+def _importtime(code):
+    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=base_dir, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr else "import failed")
+    rows = []
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            rows.append((module, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+    return rows
+
+
+def _measure_in_process(modules):
+    import importlib
+    rows = []
+    for module in modules:
+        start = time.perf_counter()
+        importlib.import_module(module)
+        elapsed = int((time.perf_counter() - start) * 1e6)
+        rows.append((module, elapsed, elapsed, 0))
+    return rows
+
+
+def print_report(modules, budget_ms=DEFAULT_IMPORT_BUDGET_MS, top=15, out=sys.stdout):
+    """Print the import-time breakdown, returns True when within budget"""
+    rows = measure_imports(modules)
+    total_us = sum(cumulative for _, _, cumulative, depth in rows if depth == 0)
+
+    print(f"Top-level imports ({', '.join(modules)}):", file=out)
+    for module, _, cumulative, depth in rows:
+        if depth == 0:
+            print(f"  {cumulative / 1000:9.1f} ms  {module}", file=out)
+
+    print(f"\nSlowest modules by self time (top {top}):", file=out)
+    for module, self_us, cumulative, _ in sorted(rows, key=lambda r: r[1], reverse=True)[:top]:
+        print(f"  {self_us / 1000:9.1f} ms  (cumulative {cumulative / 1000:.1f} ms)  {module}", file=out)
+
+    within = total_us / 1000 <= budget_ms
+    status = "OK" if within else "OVER BUDGET"
+    print(f"\nTotal import time: {total_us / 1000:.1f} ms / budget {budget_ms} ms -> {status}", file=out)
+    return within
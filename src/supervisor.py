@@ -0,0 +1,282 @@
+"""Spread the sync targets over several worker processes.
+
+The supervisor splits the targets into weighted shards, one per worker
+process. Each worker runs the normal runtime (threaded or async) on its
+shard. Workers send their log records and a periodic metrics snapshot back
+through a queue. A crashed worker is restarted with backoff. The shards
+are periodically rebalanced from the git time each target actually used.
+"""
+import json
+import logging
+import logging.handlers
+import multiprocessing
+import os
+import signal
+import threading
+import time
+
+DEFAULT_STATUS_INTERVAL = 15
+DEFAULT_REBALANCE_INTERVAL = 3600
+# Rebalance when the busiest shard exceeds the best split by this factor
+REBALANCE_THRESHOLD = 1.25
+# ...and when it saves at least this share of a core, restarts are not free
+REBALANCE_MIN_GAIN = 0.05
+
+
+def target_key(config):
+    return f"{config.github_repo}:{os.path.abspath(config.local_path)}"
+
+
+def repo_size(path):
+    """Cheap size estimate of a repository: its index plus its packs"""
+    git_dir = os.path.join(path, '.git')
+    total = 0
+    try:
+        total += os.path.getsize(os.path.join(git_dir, 'index'))
+        with os.scandir(os.path.join(git_dir, 'objects', 'pack')) as it:
+            total += sum(entry.stat().st_size for entry in it if entry.name.endswith('.pack'))
+    except OSError:
+        pass
+    return total
+
+
+def target_weights(configs, costs):
+    """Weight of each target: measured git time, else size scaled to it"""
+    sizes = {target_key(c): max(repo_size(c.local_path), 1) for c in configs}
+    known = [k for k in sizes if costs.get(k)]
+    # Seconds of git per second per byte, for targets never measured
+    rate = sum(costs[k] for k in known) / sum(sizes[k] for k in known) if known else 1.0
+    return {k: costs.get(k) or sizes[k] * rate for k in sizes}
+
+
+def partition(configs, weights, n):
+    """Greedy longest-first split of the targets into n balanced shards"""
+    shards = [[] for _ in range(n)]
+    loads = [0.0] * n
+    for config in sorted(configs, key=lambda c: weights[target_key(c)], reverse=True):
+        i = loads.index(min(loads))
+        shards[i].append(config)
+        loads[i] += weights[target_key(config)]
+    return shards
+
+
+def _max_load(shards, weights):
+    return max((sum(weights[target_key(c)] for c in shard) for shard in shards), default=0.0)
+
+
+def _worker_main(index, configs, runner, runner_kwargs, log_queue, stop, status_interval):
+    """Entry point of a worker process"""
+    # Ctrl+C reaches the whole process group, the supervisor decides when to stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    handler = logging.handlers.QueueHandler(log_queue)
+    handler.setFormatter(logging.Formatter(f"[worker {index}] %(message)s"))
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(logging.INFO)
+
+    from .metrics import MetricsRegistry
+    registry = MetricsRegistry()
+
+    def report():
+        while not stop.wait(status_interval):
+            log_queue.put(("status", index, registry.collect()))
+
+    threading.Thread(target=report, name="status", daemon=True).start()
+    runner(configs, metrics=registry, stop=stop, **runner_kwargs)
+    log_queue.put(("status", index, registry.collect()))
+
+
+class Worker:
+    def __init__(self, index, shard):
+        self.index = index
+        self.shard = shard
+        self.process = None
+        self.stop_event = None
+        self.started = None
+        self.crashes = 0
+        self.restart_at = None
+
+
+class Supervisor:
+    """Run the targets in `workers` processes and keep them running"""
+
+    def __init__(self, configs, runner, workers=None, runner_kwargs=None, costs_path=None,
+                 metrics_path=None, status_interval=DEFAULT_STATUS_INTERVAL,
+                 rebalance_interval=DEFAULT_REBALANCE_INTERVAL, max_backoff=60):
+        self.configs = configs
+        self.runner = runner
+        self.runner_kwargs = runner_kwargs or {}
+        self.n_workers = max(1, min(workers or os.cpu_count() or 1, len(configs)))
+        self.costs_path = costs_path
+        self.metrics_path = metrics_path
+        self.status_interval = status_interval
+        self.rebalance_interval = rebalance_interval
+        self.max_backoff = max_backoff
+        self.logger = logging.getLogger(__name__)
+        self._ctx = multiprocessing.get_context("spawn")
+        self._queue = self._ctx.Queue()
+        self._lock = threading.Lock()
+        self.workers = []
+        self.status = {}
+        self.costs = self._load_costs()
+        self.restarts = 0
+
+    def _load_costs(self):
+        if not self.costs_path or not os.path.exists(self.costs_path):
+            return {}
+        try:
+            with open(self.costs_path) as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"Could not read {self.costs_path}: {e}")
+            return {}
+
+    def _save_costs(self):
+        if not self.costs_path:
+            return
+        try:
+            tmp_path = f"{self.costs_path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self.costs, f, indent=2)
+            os.replace(tmp_path, self.costs_path)
+        except OSError as e:
+            self.logger.warning(f"Could not write {self.costs_path}: {e}")
+
+    def run(self):
+        listener = threading.Thread(target=self._listen, name="supervisor-log", daemon=True)
+        listener.start()
+        weights = target_weights(self.configs, self.costs)
+        self.workers = [Worker(i, shard) for i, shard in enumerate(partition(self.configs, weights, self.n_workers))]
+        for worker in self.workers:
+            self._start(worker)
+        self.logger.info(f"Supervisor started {len(self.workers)} worker(s) for {len(self.configs)} target(s)")
+        next_rebalance = time.monotonic() + self.rebalance_interval
+        stopping = threading.Event()
+        previous = None
+        if threading.current_thread() is threading.main_thread():
+            # systemd and docker stop with SIGTERM, handled like Ctrl+C
+            previous = signal.signal(signal.SIGTERM, lambda signum, frame: stopping.set())
+        try:
+            while not stopping.wait(1):
+                self._check_workers()
+                if time.monotonic() >= next_rebalance:
+                    next_rebalance = time.monotonic() + self.rebalance_interval
+                    self.rebalance()
+            self.logger.info("Stopping workers...")
+        except KeyboardInterrupt:
+            self.logger.info("Stopping workers...")
+        finally:
+            if previous is not None:
+                signal.signal(signal.SIGTERM, previous)
+            for worker in self.workers:
+                self._stop(worker)
+            self._queue.put(None)
+            listener.join(5)
+            self._save_costs()
+            self._dump_metrics()
+
+    def _start(self, worker):
+        worker.stop_event = self._ctx.Event()
+        worker.process = self._ctx.Process(
+            target=_worker_main, name=f"sync-worker-{worker.index}",
+            args=(worker.index, worker.shard, self.runner, self.runner_kwargs,
+                  self._queue, worker.stop_event, self.status_interval))
+        worker.process.start()
+        worker.started = time.monotonic()
+        worker.restart_at = None
+        repos = ", ".join(c.github_repo for c in worker.shard)
+        self.logger.info(f"Worker {worker.index} (pid {worker.process.pid}) syncs {len(worker.shard)} target(s): {repos}")
+
+    def _stop(self, worker, timeout=60):
+        if worker.process is None:
+            return
+        worker.stop_event.set()
+        worker.process.join(timeout)
+        if worker.process.is_alive():
+            self.logger.warning(f"Worker {worker.index} did not stop in {timeout}s, terminating it")
+            worker.process.terminate()
+            worker.process.join()
+        worker.process = None
+
+    def _check_workers(self):
+        now = time.monotonic()
+        for worker in self.workers:
+            if worker.process is not None and not worker.process.is_alive():
+                code = worker.process.exitcode
+                worker.process = None
+                # A worker that ran for a while starts over with a short backoff
+                if now - worker.started > self.max_backoff * 2:
+                    worker.crashes = 0
+                worker.crashes += 1
+                delay = min(self.max_backoff, 2 ** (worker.crashes - 1))
+                worker.restart_at = now + delay
+                self.logger.error(f"Worker {worker.index} exited with code {code}, restarting in {delay}s")
+            if worker.process is None and worker.restart_at is not None and now >= worker.restart_at:
+                self.restarts += 1
+                self._start(worker)
+
+    def rebalance(self):
+        """Re-split the targets from measured costs, restart the shards that changed"""
+        self._save_costs()
+        weights = target_weights(self.configs, self.costs)
+        shards = partition(self.configs, weights, len(self.workers))
+        current = _max_load([w.shard for w in self.workers], weights)
+        best = _max_load(shards, weights)
+        if not best or current <= best * REBALANCE_THRESHOLD or current - best < REBALANCE_MIN_GAIN:
+            return False
+        self.logger.info(f"Rebalancing workers: busiest shard {current:.3f} -> {best:.3f} git s/s")
+        changed = [(w, shard) for w, shard in zip(self.workers, shards)
+                   if {target_key(c) for c in w.shard} != {target_key(c) for c in shard}]
+        # Stop every changed worker first, a target is never synced by two workers
+        for worker, _ in changed:
+            self._stop(worker)
+        for worker, shard in changed:
+            worker.shard = shard
+            worker.crashes = 0
+            self._start(worker)
+        return True
+
+    def _listen(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            if isinstance(item, tuple):
+                self._on_status(*item[1:])
+            else:
+                logging.getLogger(item.name).handle(item)
+
+    def _on_status(self, index, snapshot):
+        with self._lock:
+            self.status[index] = snapshot
+            worker = self.workers[index] if index < len(self.workers) else None
+            uptime = time.monotonic() - worker.started if worker and worker.started else 0
+            for target in snapshot["targets"]:
+                seconds = sum(h["sum"] for h in target["git_command_seconds"].values())
+                if uptime >= self.status_interval:
+                    # Share of a core spent in git, used as weight
+                    key = f"{target['repo']}:{os.path.abspath(target['local_path'])}"
+                    self.costs[key] = seconds / uptime
+        self._dump_metrics()
+
+    def collect(self):
+        """Metrics snapshot of every worker, in the MetricsRegistry.collect format"""
+        with self._lock:
+            targets = []
+            for index, snapshot in sorted(self.status.items()):
+                for target in snapshot["targets"]:
+                    targets.append(dict(target, worker=index))
+        alive = sum(1 for w in self.workers if w.process is not None and w.process.is_alive())
+        return {"timestamp": time.time(), "workers": len(self.workers), "workers_alive": alive,
+                "worker_restarts": self.restarts, "targets": targets}
+
+    def _dump_metrics(self):
+        if not self.metrics_path:
+            return
+        try:
+            tmp_path = f"{self.metrics_path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.collect(), f, indent=2)
+            os.replace(tmp_path, self.metrics_path)
+        except OSError as e:
+            self.logger.warning(f"Could not write metrics to {self.metrics_path}: {e}")
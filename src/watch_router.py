@@ -0,0 +1,187 @@
+import os
+import logging
+import threading
+from watchdog.events import (
+    FileSystemEventHandler,
+    DirCreatedEvent, DirDeletedEvent, FileCreatedEvent, FileDeletedEvent,
+)
+
+_HANDLERS = object()
+_PATH = object()
+_POLLING = object()
+_META = (_HANDLERS, _PATH, _POLLING)
+
+
+def _key(path):
+    return os.path.normcase(os.path.abspath(path))
+
+
+def _is_within(path, root):
+    return path == root or path.startswith(root.rstrip(os.sep) + os.sep)
+
+
+class WatchRouter(FileSystemEventHandler):
+    """Share one set of recursive watches between every target.
+
+    Each watch path is registered with the handler interested in it, and
+    only the outermost paths are scheduled on the observer: a path nested in
+    (or equal to) an already watched one adds no new watch. Events are routed
+    to the handlers of every registered path containing them, found by
+    walking a trie of path components. Paths registered with `polling`
+    intervals are scheduled on a CompactPollingObserver instead, deduplicated
+    among themselves.
+    """
+
+    def __init__(self, observer):
+        self.observer = observer
+        self.polling_observer = None
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.RLock()
+        self._trie = {}
+        # (root, polling intervals or None) -> ObservedWatch
+        self._watches = {}
+        self.registrations = 0
+
+    def add(self, path, handler, polling=None):
+        """Watch `path` for `handler`, natively or polled every `polling` = (interval, max_interval)"""
+        path = _key(path)
+        with self._lock:
+            node = self._trie
+            for part in self._parts(path):
+                node = node.setdefault(part, {})
+            node[_PATH] = path
+            node[_POLLING] = polling
+            handlers = node.setdefault(_HANDLERS, [])
+            if handler in handlers:
+                return
+            handlers.append(handler)
+            self.registrations += 1
+            self._reschedule()
+
+    def remove(self, handler):
+        """Unregister every path of `handler`, rescheduling the remaining ones"""
+        with self._lock:
+            stack = [self._trie]
+            while stack:
+                node = stack.pop()
+                handlers = node.get(_HANDLERS)
+                if handlers and handler in handlers:
+                    handlers.remove(handler)
+                    self.registrations -= 1
+                stack.extend(child for key, child in node.items() if key not in _META)
+            self._reschedule()
+
+    def _reschedule(self):
+        registered = []
+        stack = [self._trie]
+        while stack:
+            node = stack.pop()
+            if node.get(_HANDLERS):
+                registered.append((node[_PATH], node.get(_POLLING)))
+            stack.extend(child for key, child in node.items() if key not in _META)
+        wanted = set()
+        for path, polling in registered:
+            # Only a watch of the same kind covers a path
+            if not any(p != path and _is_within(path, p) and (q is None) == (polling is None)
+                       for p, q in registered):
+                wanted.add((path, polling))
+        for key in [k for k in self._watches if k not in wanted]:
+            observer = self.observer if key[1] is None else self.polling_observer
+            observer.unschedule(self._watches.pop(key))
+        for key in wanted - set(self._watches):
+            root, polling = key
+            if polling is None:
+                self._watches[key] = self.observer.schedule(self, root, recursive=True)
+            else:
+                interval, max_interval = polling
+                self._watches[key] = self._polling().schedule(
+                    self, root, recursive=True, interval=interval, max_interval=max_interval)
+
+    def _polling(self):
+        if self.polling_observer is None:
+            from .polling_observer import CompactPollingObserver
+            self.polling_observer = CompactPollingObserver()
+            self.polling_observer.start()
+        return self.polling_observer
+
+    def stop(self):
+        """Stop the polling observer, the native one belongs to the caller"""
+        if self.polling_observer is not None:
+            self.polling_observer.stop()
+            if self.polling_observer.is_alive():
+                self.polling_observer.join()
+
+    @staticmethod
+    def _parts(path):
+        drive, rest = os.path.splitdrive(path)
+        return [drive or os.sep] + [p for p in rest.split(os.sep) if p]
+
+    def handlers_for(self, path):
+        """Handlers of every registered path containing `path`"""
+        found = []
+        with self._lock:
+            node = self._trie
+            for part in self._parts(_key(path)):
+                node = node.get(part)
+                if node is None:
+                    break
+                for handler in node.get(_HANDLERS, ()):
+                    if handler not in found:
+                        found.append(handler)
+        return found
+
+    def dispatch(self, event):
+        src_handlers = self.handlers_for(event.src_path)
+        if event.event_type != "moved":
+            for handler in src_handlers:
+                handler.dispatch(event)
+            return
+        # A move crossing watch paths is a deletion for one side, a creation for the other
+        dest_handlers = self.handlers_for(event.dest_path)
+        deleted_cls = DirDeletedEvent if event.is_directory else FileDeletedEvent
+        created_cls = DirCreatedEvent if event.is_directory else FileCreatedEvent
+        for handler in src_handlers:
+            if handler in dest_handlers:
+                handler.dispatch(event)
+            else:
+                handler.dispatch(deleted_cls(event.src_path))
+        created = [handler for handler in dest_handlers if handler not in src_handlers]
+        if not created:
+            return
+        events = [created_cls(event.dest_path)]
+        if event.is_directory:
+            # Handlers skip directory creations, the files arriving with it are announced one by one
+            events += [FileCreatedEvent(path) for path in self._files_under(event.dest_path)]
+        for handler in created:
+            for created_event in events:
+                handler.dispatch(created_event)
+
+    @staticmethod
+    def _files_under(path):
+        for dirpath, dirnames, filenames in os.walk(path):
+            for name in filenames:
+                yield os.path.join(dirpath, name)
+            for name in dirnames:
+                # Not followed by walk, git tracks the link itself
+                if os.path.islink(os.path.join(dirpath, name)):
+                    yield os.path.join(dirpath, name)
+
+    @property
+    def watch_count(self):
+        return len(self._watches)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "watch_paths": self.registrations,
+                "watches": len(self._watches),
+                "watches_saved": self.registrations - len(self._watches),
+                "roots": sorted(root for root, _ in self._watches),
+                "polled_roots": sorted(root for root, polling in self._watches if polling is not None),
+            }
+
+    def log_report(self):
+        stats = self.stats()
+        self.logger.info(
+            f"{stats['watches']} recursive watch(es) cover {stats['watch_paths']} watch path(s), "
+            f"{stats['watches_saved']} duplicate watch(es) avoided")
@@ -1,29 +1,47 @@
-import os
-import time
-from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
-from .git_sync import GitSyncManager
 
 class FileChangeHandler(FileSystemEventHandler):
     def __init__(self, sync_manager):
         self.sync_manager = sync_manager
+        self.ignore = sync_manager.ignore
+        self.digests = sync_manager.digests
+        self.fsmonitor = sync_manager.fsmonitor
+
+    def dispatch(self, event):
+        if self.fsmonitor is not None and event.event_type in ("modified", "created", "deleted", "moved"):
+            # git must hear about every change, ignored or not
+            self.fsmonitor.record(event.src_path, event.is_directory)
+            if event.event_type == "moved":
+                self.fsmonitor.record(event.dest_path, event.is_directory)
+        super().dispatch(event)
+
+    def _dispatch(self, path, kind, is_directory=False):
+        if self.ignore.is_ignore_file(path):
+            self.ignore.reload_file(path)
+        if self.ignore.is_ignored(path, is_directory):
+            return
+        if kind == "modified" and not self.digests.changed(path):
+            # Touch, metadata-only change or identical rewrite
+            return
+        if kind == "deleted":
+            self.digests.forget(path, is_directory)
+        self.sync_manager.handle_change(path, kind)
 
     def on_modified(self, event):
         if event.is_directory:
             return
-        self.sync_manager.handle_change(event.src_path)
+        self._dispatch(event.src_path, "modified")
         
     def on_created(self, event):
         if event.is_directory:
             return
-        self.sync_manager.handle_change(event.src_path)
+        self._dispatch(event.src_path, "created")
         
     def on_deleted(self, event):
-        if event.is_directory:
-            return
-        self.sync_manager.handle_change(event.src_path)
+        # Directory removals are kept so their whole subtree gets unstaged
+        self._dispatch(event.src_path, "deleted", event.is_directory)
         
     def on_moved(self, event):
-        if event.is_directory:
-            return
-        self.sync_manager.handle_change(event.dest_path)
\ No newline at end of file
+        # A move is a removal of the source and a creation of the destination
+        self._dispatch(event.src_path, "deleted", event.is_directory)
+        self._dispatch(event.dest_path, "created", event.is_directory)
@@ -0,0 +1,104 @@
+import logging
+import queue
+import threading
+
+_STOP = object()
+
+
+class SyncWorker:
+    """Serialized executor running all git work of one target.
+
+    The watchdog observer thread only calls `submit`, which hands the path to
+    a bounded queue. When the queue is full, `policy` decides what happens:
+    "block" waits up to `block_timeout` seconds for room (backpressure on the
+    observer), "drop" discards the event and marks the pending batch as
+    overflowed so the next sync falls back to a full working tree sync.
+    """
+
+    def __init__(self, sync_manager, maxsize=10000, policy="drop", block_timeout=5):
+        self.sync_manager = sync_manager
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.logger = logging.getLogger(__name__)
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._thread = None
+
+        # Counters
+        self.submitted = 0
+        self.dropped = 0
+        self.blocked = 0
+        self.max_depth = 0
+
+    @property
+    def name(self):
+        return f"sync-{self.sync_manager.config.github_repo}"
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def submit(self, path, kind="modified"):
+        self.submitted += 1
+        item = (path, kind)
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            if self.policy == "block":
+                self.blocked += 1
+                try:
+                    self._queue.put(item, timeout=self.block_timeout)
+                    return
+                except queue.Full:
+                    pass
+            self.dropped += 1
+            self.sync_manager.changes.mark_overflow()
+            return
+        depth = self._queue.qsize()
+        if depth > self.max_depth:
+            self.max_depth = depth
+
+    def stop(self, timeout=None):
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self):
+        changes = self.sync_manager.changes
+        while True:
+            try:
+                item = self._queue.get(timeout=changes.due_in())
+            except queue.Empty:
+                self._flush()
+                continue
+            if item is _STOP:
+                return
+            changes.add(*item)
+            # Drain what is already queued before looking at the deadline again
+            while True:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    return
+                changes.add(*item)
+            if changes.due_in() == 0:
+                self._flush()
+
+    def _flush(self):
+        try:
+            self.sync_manager.flush()
+        except Exception as e:
+            self.logger.error(f"Worker {self.name} failed to sync: {e}")
+
+    def stats(self):
+        return {
+            "queue_depth": self._queue.qsize(),
+            "max_queue_depth": self.max_depth,
+            "submitted": self.submitted,
+            "dropped": self.dropped,
+            "blocked": self.blocked,
+        }
@@ -0,0 +1,124 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+import git
+
+from src.commit_engine import InProcessEngine, SubprocessEngine
+
+
+def run_git(cwd, *args):
+    return subprocess.run(
+        ["git", "-c", "user.name=test", "-c", "user.email=test@example.com", *args],
+        cwd=cwd, check=True, capture_output=True, text=True,
+    ).stdout.strip()
+
+
+def write(root, rel, content):
+    path = os.path.join(root, rel)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(content)
+
+
+class StagingEnginesTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+
+    def make_repo(self, name):
+        root = os.path.join(self.tmp, name)
+        os.makedirs(root)
+        run_git(root, "init", "-q")
+        write(root, "a.txt", "a\n")
+        write(root, "dir/b.txt", "b\n")
+        write(root, "dir/c.txt", "c\n")
+        # git commit leaves a TREE (cache-tree) extension in the index
+        run_git(root, "add", "-A")
+        run_git(root, "commit", "-qm", "init")
+        write(root, "a.txt", "changed\n")
+        write(root, "dir/new.txt", "new\n")
+        os.remove(os.path.join(root, "dir", "c.txt"))
+        return root
+
+    def stage(self, engine_cls, name):
+        root = self.make_repo(name)
+        engine = engine_cls(git.Repo(root))
+        engine.stage_paths(["a.txt", os.path.join("dir", "new.txt"), os.path.join("dir", "c.txt")])
+        self.assertTrue(engine.has_staged_changes())
+        return root
+
+    def test_engines_write_the_same_tree(self):
+        subprocess_root = self.stage(SubprocessEngine, "subprocess")
+        inprocess_root = self.stage(InProcessEngine, "inprocess")
+        expected = run_git(subprocess_root, "write-tree")
+        self.assertEqual(run_git(inprocess_root, "write-tree"), expected)
+        self.assertNotEqual(expected, run_git(inprocess_root, "rev-parse", "HEAD^{tree}"))
+
+    def test_git_commit_after_inprocess_staging(self):
+        root = self.stage(InProcessEngine, "inprocess")
+        run_git(root, "commit", "-qm", "manual")
+        self.assertEqual(run_git(root, "status", "--porcelain"), "")
+        changed = run_git(root, "diff", "--name-status", "HEAD~1", "HEAD").splitlines()
+        self.assertEqual(sorted(changed), ["A\tdir/new.txt", "D\tdir/c.txt", "M\ta.txt"])
+
+    def test_engines_agree_across_commits(self):
+        roots = [self.make_repo(name) for name in ("subprocess", "inprocess")]
+        engines = [SubprocessEngine(git.Repo(roots[0])), InProcessEngine(git.Repo(roots[1]))]
+        self.addCleanup(engines[1].close)
+        steps = [
+            (lambda root: None, ["a.txt", os.path.join("dir", "new.txt"), os.path.join("dir", "c.txt")]),
+            # Rewritten with the same content
+            (lambda root: write(root, "a.txt", "changed\n"), ["a.txt"]),
+            (lambda root: os.chmod(os.path.join(root, "a.txt"), 0o755), ["a.txt"]),
+            (lambda root: os.symlink("a.txt", os.path.join(root, "link")), ["link"]),
+            # Edited then reverted before the sync
+            (lambda root: write(root, "dir/new.txt", "new\n"), [os.path.join("dir", "new.txt")]),
+            (lambda root: shutil.rmtree(os.path.join(root, "dir")), ["dir"]),
+            (lambda root: write(root, "dir", "now a file\n"), ["dir"]),
+        ]
+        for i, (change, paths) in enumerate(steps):
+            answers = []
+            for root, engine in zip(roots, engines):
+                change(root)
+                engine.stage_paths(paths)
+                answers.append(engine.has_staged_changes())
+            trees = [run_git(root, "write-tree") for root in roots]
+            self.assertEqual(trees[0], trees[1], f"step {i}")
+            self.assertEqual(answers[0], answers[1], f"step {i}")
+            if answers[0]:
+                for engine in engines:
+                    engine.commit(f"step {i}")
+        self.assertEqual(run_git(roots[0], "rev-list", "--count", "HEAD"),
+                         run_git(roots[1], "rev-list", "--count", "HEAD"))
+        self.assertEqual(run_git(roots[1], "status", "--porcelain"), "")
+
+    def test_inprocess_sees_changes_staged_by_hand(self):
+        root = self.make_repo("inprocess")
+        engine = InProcessEngine(git.Repo(root))
+        self.addCleanup(engine.close)
+        engine.stage_paths(["a.txt", os.path.join("dir", "new.txt"), os.path.join("dir", "c.txt")])
+        engine.commit("sync")
+        self.assertFalse(engine.has_staged_changes())
+        write(root, "manual.txt", "by hand\n")
+        run_git(root, "add", "manual.txt")
+        self.assertTrue(engine.has_staged_changes())
+
+    def test_inprocess_skips_unchanged_paths(self):
+        root = self.make_repo("inprocess")
+        engine = InProcessEngine(git.Repo(root))
+        self.addCleanup(engine.close)
+        engine.stage_paths(["a.txt", os.path.join("dir", "new.txt"), os.path.join("dir", "c.txt")])
+        engine.commit("sync")
+        index = os.stat(os.path.join(root, ".git", "index"))
+        write(root, "a.txt", "changed\n")
+        engine.stage_paths(["a.txt"])
+        self.assertFalse(engine.has_staged_changes())
+        # Neither staged nor checked with a git process
+        self.assertEqual(os.stat(os.path.join(root, ".git", "index")).st_mtime_ns, index.st_mtime_ns)
+
+
+if __name__ == "__main__":
+    unittest.main()